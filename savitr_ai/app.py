@@ -1,13 +1,29 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import pandas as pd
-import pickle
 import os
 from flask_cors import CORS
 import logging
-import numpy as np
-import math
 import json
-from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+import math
+import threading
+import time
+from distance import HaversineCosts, location_coordinates, update_distance_matrix
+from jobs import FINISHED, job_queue_from_env
+import metrics
+from model_registry import DEFAULT_MODEL, ModelRegistry, UnknownModelError
+from route_cache import RouteCache, from_canonical, matrix_key, route_cache_from_env, route_key, to_canonical
+from route_export import POLYLINE_PRECISION, encode_polyline, iter_geojson, route_indices
+from solver_pool import PoolBusy, share_array, solver_pool_from_env
+from startup import STARTUP_MODE, lazy_import
+
+# The routing stack (OR-Tools, scipy); with STARTUP_MODE=lazy each module is
+# imported by the first request that uses it instead of at startup
+clustering = lazy_import('clustering')
+portfolio = lazy_import('portfolio')
+road_network = lazy_import('road_network')
+route_solvers = lazy_import('route_solvers')
+solver = lazy_import('solver')
+vrp = lazy_import('vrp')
 
 app = Flask(__name__)
 # Enable CORS for all routes with proper configuration
@@ -25,6 +41,93 @@ app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keep solves well inside gunicorn's 120 s worker timeout
+MAX_TIME_LIMIT_MS = 100000
+
+ROUTE_MODES = ('tsp', 'vrp', 'cluster')
+# /api/route bodies: the default JSON, a streamed GeoJSON FeatureCollection, or
+# JSON with an encoded polyline per route instead of the per-stop delivery list
+ROUTE_FORMATS = ('json', 'geojson', 'polyline')
+# Delivery fields that are not copied into GeoJSON properties
+COORDINATE_KEYS = ('lat', 'lng', 'latitude', 'longitude')
+# Above this many deliveries a plain TSP request is routed cluster-first
+MAX_DENSE_STOPS = 3000
+
+# Solved routes keyed on the stop set; see route_cache for the env settings
+route_cache = route_cache_from_env()
+# Recent dense matrices, so re-optimization only computes changed rows
+matrix_cache = RouteCache(max_entries=8)
+MAX_CACHED_MATRIX_STOPS = 2000
+# Default budget for warm-started re-optimization of a small edit
+REOPTIMIZE_TIME_LIMIT_MS = 1000
+
+# Synchronous solves run here, one per core; see solver_pool for the env settings
+solver_pool = solver_pool_from_env()
+# Processes a cluster or in-process portfolio solve may fan out over (unset: one
+# per core / strategy); asgi's route workers set 1 to stay a single process each
+SOLVE_PROCESSES = int(os.environ.get('SOLVE_PROCESSES', 0)) or None
+# Haversine, or road-network costs when ROAD_NETWORK_PATH is set; see road_network
+cost_provider = (road_network.cost_provider_from_env(pool=solver_pool)
+                 if os.environ.get('ROAD_NETWORK_PATH') else HaversineCosts())
+# Long solves submitted with "job": true; see jobs for the env settings
+job_queue = job_queue_from_env()
+# Idle SSE streams send a comment this often so proxies keep them open
+SSE_HEARTBEAT_S = 15
+
+# Pipelines are unpickled once per worker and shared by every request
+model_registry = ModelRegistry()
+# Set by warm_up(); until then /health reports the app as not ready
+ready = threading.Event()
+
+# Honour the X-Profile request header (cprofile / pyinstrument); keep off in production
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+
+
+def request_route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+    kind = request.headers.get('X-Profile', '').lower()
+    if PROFILING_ENABLED and kind in metrics.PROFILERS:
+        g.profiler = (kind, metrics.start_profiler(kind))
+
+
+@app.after_request
+def finish_request_metrics(response):
+    kind, profiler = g.pop('profiler', (None, None))
+    if profiler is not None:
+        # Swap the body for the profile; the handler's own status goes in a header
+        response = Response(metrics.profile_report(kind, profiler), mimetype='text/plain',
+                            headers={'X-Profiled-Status': str(response.status_code)})
+    elif kind:
+        response.headers['X-Profile'] = 'unavailable'
+
+    if response.is_streamed and 'request_started' in g:
+        # Observe once the body has been sent; stages recorded while it
+        # streams are appended to this same list
+        observation = (request_route(), request.method, response.status_code,
+                       g.get('metrics_model', ''), g.request_started, g.setdefault('stages', []))
+        response.call_on_close(lambda: metrics.observe_request(*observation))
+        g.metrics_deferred = True
+    else:
+        g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def observe_request_metrics(exc):
+    if not g.get('metrics_deferred'):
+        metrics.finish_request(request_route(), request.method, g.get('response_status', 500))
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route("/")
 def hello():
     logger.info("Root endpoint called")
@@ -33,6 +136,12 @@ def hello():
 @app.route("/health")
 def health():
     logger.info("Health check endpoint called")
+    if not ready.is_set():
+        return jsonify({
+            "status": "starting",
+            "message": "Savitr AI API is warming up its models",
+            "port": os.environ.get('PORT', '5000')
+        }), 503
     return jsonify({
         "status": "healthy",
         "message": "Savitr AI API is running",
@@ -48,62 +157,160 @@ def route_options():
     response.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization, Accept, Origin")
     return response, 200
 
+# Input columns of an order, in the Post.csv layout (minus the training target)
+ORDER_COLUMNS = [
+    'Days for shipping (real)',
+    'Days for shipment (scheduled)',
+    'Delivery Status',
+    'Customer Segment',
+    'Latitude',
+    'Longitude',
+    'Order City',
+    'order date (DateOrders)',
+    'Order Item Id',
+    'Order Item Quantity',
+    'Order State',
+    'shipping date (DateOrders)',
+    'Shipping Mode',
+    'User ID',
+    'Admin Recomended Slots/Previous Optimized Delivered Slots',
+    'Parcel Delivered in This Slot'
+]
+NUMERIC_ORDER_COLUMNS = [
+    'Days for shipping (real)',
+    'Days for shipment (scheduled)',
+    'Latitude',
+    'Longitude',
+    'Order Item Id',
+    'Order Item Quantity',
+    'User ID'
+]
+# Rows per model.predict call on the batch endpoint
+BATCH_CHUNK_SIZE = 5000
+DEFAULT_SLOT = "10:00 AM - 12:00 PM"
+
+
+def preprocess_new_order(order_data):
+    """Derive model features for every row of an order DataFrame in one pass."""
+    missing = [col for col in ORDER_COLUMNS if col not in order_data.columns]
+    order_data = order_data.reindex(columns=list(order_data.columns) + missing)
+    # Query strings and JSON bodies may carry numbers as text
+    for col in NUMERIC_ORDER_COLUMNS:
+        order_data[col] = pd.to_numeric(order_data[col], errors='coerce')
+
+    order_date = pd.to_datetime(order_data['order date (DateOrders)'], errors='coerce')
+    shipping_date = pd.to_datetime(order_data['shipping date (DateOrders)'], errors='coerce')
+    order_data['order_date'] = order_date
+    order_data['shipping_date'] = shipping_date
+    order_data['order_day_of_week'] = order_date.dt.dayofweek
+    order_data['order_month'] = order_date.dt.month
+    order_data['order_day'] = order_date.dt.day
+    order_data['order_hour'] = order_date.dt.hour
+    order_data['shipping_day_of_week'] = shipping_date.dt.dayofweek
+    order_data['shipping_month'] = shipping_date.dt.month
+    order_data['shipping_day'] = shipping_date.dt.day
+    order_data['distance_proxy'] = order_data['Latitude'].abs() + order_data['Longitude'].abs()
+    order_data['shipping_delay'] = order_data['Days for shipping (real)'] - order_data['Days for shipment (scheduled)']
+    store = current_user_features()
+    order_data['user_id_encoded'] = store.modal_slots(order_data['User ID']) if store else math.nan
+    return order_data
+
+
+def current_user_features():
+    """The user feature store, or None before one has been built (all users cold-start)."""
+    try:
+        return model_registry.user_features()
+    except OSError:
+        return None
+
+
+def to_number(value):
+    """Scalar version of pd.to_numeric(errors='coerce')."""
+    if isinstance(value, (int, float)):
+        return value
+    # float() also accepts '1_000' and non-ASCII digits, which pandas rejects
+    if isinstance(value, str) and value.isascii() and '_' not in value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return math.nan
+
+
+def order_features(order):
+    """Model inputs for one raw order dict, derived as preprocess_new_order does, without pandas."""
+    features = dict(order)
+    for col in NUMERIC_ORDER_COLUMNS:
+        features[col] = to_number(order.get(col))
+    features['shipping_delay'] = features['Days for shipping (real)'] - features['Days for shipment (scheduled)']
+    store = current_user_features()
+    features['user_id_encoded'] = store.modal_slot(features['User ID']) if store else math.nan
+    return features
+
+
+def predict_delivery_slot(order, model, y_encoder):
+    """Decoded slot label for one raw order dict.
+
+    Compact models take the single-row path (no DataFrame, no sklearn
+    validation); pickled pipelines go through preprocess_new_order.
+    """
+    if not hasattr(model, 'predict_one'):
+        with metrics.stage('preprocess'):
+            preprocessed_order = preprocess_new_order(pd.DataFrame([order]))
+        return predict_delivery_slots(preprocessed_order, model, y_encoder)[0]
+    with metrics.stage('preprocess'):
+        features = order_features(order)
+    with metrics.stage('predict'):
+        return y_encoder.categories_[0][int(model.predict_one(features))]
+
+
+def predict_delivery_slots(data, model, y_encoder):
+    """Predict decoded slot labels for a preprocessed order DataFrame."""
+    with metrics.stage('predict'):
+        pred_encoded = model.predict(data)
+        return y_encoder.inverse_transform(pred_encoded.reshape(-1, 1)).ravel()
+
+
+def resolve_slot_model():
+    """Return (model, y_encoder) for the request's ?model= choice, or an error response."""
+    name = request.args.get('model') or DEFAULT_MODEL
+    try:
+        model = model_registry.get(name)
+    except UnknownModelError:
+        return None, (jsonify({
+            'error': 'Unknown model',
+            'message': f"Model must be one of: {', '.join(model_registry.available())}"
+        }), 400)
+    metrics.set_model(name)
+    return (model, model_registry.encoders()['y_encoder']), None
+
+
 @app.route("/api/slot")
 def slot():
-    logger.info(f"Received slot prediction request: {request.args}")
-    
-    def load_delivery_prediction_model(model_path='saved_models/logistic_regression_pipeline.pkl', encoders_path='saved_models/encoders.pkl'):
-        with open(model_path, 'rb') as file:
-            model = pickle.load(file)
-        with open(encoders_path, 'rb') as file:
-            encoders = pickle.load(file)
-        return model, encoders
-
-    def predict_delivery_slot(data, model, y_encoder):
-        if isinstance(data, dict):
-            data = pd.DataFrame([data])
-        pred_encoded = model.predict(data)
-        pred_decoded = y_encoder.inverse_transform(pred_encoded.reshape(-1, 1))
-        return pred_decoded[0][0]
-
-    def preprocess_new_order(order_data):
-        order_data = order_data.copy()
-        order_data['order_date'] = pd.to_datetime(order_data['order date (DateOrders)'], errors='coerce')
-        order_data['shipping_date'] = pd.to_datetime(order_data['shipping date (DateOrders)'], errors='coerce')
-        order_data['order_day_of_week'] = order_data['order_date'].dayofweek
-        order_data['order_month'] = order_data['order_date'].month
-        order_data['order_day'] = order_data['order_date'].day
-        order_data['order_hour'] = order_data['order_date'].hour
-        order_data['shipping_day_of_week'] = order_data['shipping_date'].dayofweek
-        order_data['shipping_month'] = order_data['shipping_date'].month
-        order_data['shipping_day'] = order_data['shipping_date'].day        
-        order_data['distance_proxy'] = abs(order_data['Latitude']) + abs(order_data['Longitude'])
-        order_data['shipping_delay'] = order_data['Days for shipping (real)'] - order_data['Days for shipment (scheduled)']
-        order_data['user_id_encoded'] = order_data['User ID']
-        return order_data
-
-    model, encoders = load_delivery_prediction_model()
-    y_encoder = encoders['y_encoder']
-    
-    if request.args:
+    logger.info("Received slot prediction request")
+
+    resolved, error = resolve_slot_model()
+    if error:
+        return error
+    model, y_encoder = resolved
+
+    with metrics.stage('parse'):
+        order_args = request.args.to_dict()
+        order_args.pop('model', None)
+
+    if order_args:
         logger.info("Using request parameters")
-        try:
-            new_order = dict(request.args)
-            logger.info(f"Request parameters converted to dict: {new_order}")
-        except Exception as e:
-            logger.error(f"Error processing request parameters: {e}")
-            new_order = get_default_order()
+        new_order = order_args
     else:
         logger.info("Using default order data")
         new_order = get_default_order()
     
     try:
-        preprocessed_order = preprocess_new_order(new_order)
-        predicted_slot = predict_delivery_slot(preprocessed_order, model, y_encoder)
+        predicted_slot = predict_delivery_slot(new_order, model, y_encoder)
         logger.info(f"Predicted slot: {predicted_slot}")
     except Exception as e:
         logger.error(f"Error during prediction: {e}")
-        predicted_slot = "10:00 AM - 12:00 PM"  # Default prediction if something fails
+        predicted_slot = DEFAULT_SLOT  # Default prediction if something fails
     
     single_order_result = {
         "customer": new_order.get('Customer Segment', 'Consumer'),
@@ -116,9 +323,277 @@ def slot():
     response = {
         "prediction": single_order_result,
     }
-    
-    logger.info(f"Sending response: {response}")
-    return jsonify(response), 200
+
+    with metrics.stage('serialize'):
+        return jsonify(response), 200
+
+
+def predict_order_chunk(chunk, model, y_encoder):
+    """Predict one chunk of raw orders and return the rows the batch endpoint sends back."""
+    with metrics.stage('preprocess'):
+        orders = preprocess_new_order(chunk)
+    return pd.DataFrame({
+        'Order Item Id': orders['Order Item Id'],
+        'customer': orders['Customer Segment'].fillna('Consumer'),
+        'Latitude': orders['Latitude'].fillna(0),
+        'Longitude': orders['Longitude'].fillna(0),
+        'location': orders['Order City'].fillna('Unknown').astype(str) + ', ' + orders['Order State'].fillna('Unknown').astype(str),
+        'predicted_optimal_slot': predict_delivery_slots(orders, model, y_encoder)
+    })
+
+
+@app.route("/api/slot/batch", methods=["POST"])
+def slot_batch():
+    """Predict slots for a whole manifest.
+
+    Accepts either a JSON array of orders (or {"orders": [...]}) or a text/csv
+    body in the Post.csv column layout. CSV bodies are read and answered chunk
+    by chunk, so a manifest never has to fit in memory at once.
+    """
+    resolved, error = resolve_slot_model()
+    if error:
+        return error
+    model, y_encoder = resolved
+
+    if request.mimetype == 'text/csv':
+        try:
+            with metrics.stage('parse'):
+                reader = pd.read_csv(request.stream, chunksize=BATCH_CHUNK_SIZE)
+                first_chunk = next(reader)
+        except (StopIteration, ValueError, pd.errors.ParserError) as e:
+            return jsonify({
+                'error': 'Invalid CSV',
+                'message': str(e) or 'CSV body is empty'
+            }), 400
+
+        def generate():
+            predictions = predict_order_chunk(first_chunk, model, y_encoder)
+            with metrics.stage('serialize'):
+                body = predictions.to_csv(index=False)
+            yield body
+            for chunk in reader:
+                predictions = predict_order_chunk(chunk, model, y_encoder)
+                with metrics.stage('serialize'):
+                    body = predictions.to_csv(index=False, header=False)
+                yield body
+
+        logger.info("Streaming batch slot predictions as CSV")
+        return Response(stream_with_context(generate()), mimetype='text/csv')
+
+    with metrics.stage('parse'):
+        orders = request.get_json(silent=True)
+    if isinstance(orders, dict):
+        orders = orders.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({
+            'error': 'No orders provided',
+            'message': 'Request body must be a JSON array of orders or a text/csv manifest'
+        }), 400
+
+    with metrics.stage('parse'):
+        frame = pd.DataFrame.from_records(orders)
+    results = [
+        predict_order_chunk(frame.iloc[start:start + BATCH_CHUNK_SIZE], model, y_encoder)
+        for start in range(0, len(frame), BATCH_CHUNK_SIZE)
+    ]
+    predictions = pd.concat(results, ignore_index=True)
+    # NaN is not valid JSON
+    predictions = predictions.astype(object).where(predictions.notna(), None)
+
+    logger.info(f"Predicted slots for {len(predictions)} orders")
+    with metrics.stage('serialize'):
+        return jsonify({
+            'count': len(predictions),
+            'predictions': predictions.to_dict('records')
+        }), 200
+
+
+def parse_solve_options(data):
+    """Read the optional solver budget from a /api/route body.
+
+    Recognised keys: time_limit_ms, solution_limit, no_improvement_ms (0 turns
+    the early stop off), first_solution and metaheuristic. Raises ValueError
+    on bad values.
+    """
+    options = {}
+    for key, upper in (('time_limit_ms', MAX_TIME_LIMIT_MS),
+                       ('solution_limit', None),
+                       ('no_improvement_ms', MAX_TIME_LIMIT_MS)):
+        if data.get(key) is None:
+            continue
+        try:
+            value = int(data[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be an integer")
+        if value < 0 or (key != 'no_improvement_ms' and value == 0):
+            raise ValueError(f"{key} must be positive")
+        options[key] = min(value, upper) if upper else value
+
+    first_solution = data.get('first_solution')
+    if first_solution is not None:
+        first_solution = str(first_solution).upper()
+        if first_solution not in solver.FIRST_SOLUTION_STRATEGIES:
+            raise ValueError(f"first_solution must be one of: {', '.join(solver.FIRST_SOLUTION_STRATEGIES)}")
+        options['first_solution'] = first_solution
+
+    metaheuristic = data.get('metaheuristic')
+    if metaheuristic is not None:
+        metaheuristic = str(metaheuristic).upper()
+        if metaheuristic not in solver.METAHEURISTICS:
+            raise ValueError(f"metaheuristic must be one of: {', '.join(solver.METAHEURISTICS)}")
+        options['metaheuristic'] = metaheuristic
+    return options
+
+
+def parse_portfolio(value):
+    """`true` for the default portfolio, or a list of "FIRST_SOLUTION/METAHEURISTIC" names."""
+    if value is True:
+        return [list(strategy) for strategy in portfolio.DEFAULT_PORTFOLIO]
+    if not isinstance(value, list) or not value:
+        raise ValueError('portfolio must be true or a list of "FIRST_SOLUTION/METAHEURISTIC" strategies')
+    strategies = []
+    for name in value:
+        first_solution, _, metaheuristic = str(name).upper().partition('/')
+        if first_solution not in solver.FIRST_SOLUTION_STRATEGIES or metaheuristic not in solver.METAHEURISTICS:
+            raise ValueError(f"Unknown portfolio strategy '{name}'")
+        strategies.append([first_solution, metaheuristic])
+    return strategies
+
+
+def parse_route_params(data, mode):
+    """Read the mode-specific /api/route options (neighbors, cluster settings); raises ValueError."""
+    params = {}
+    if mode == 'cluster':
+        params['max_cluster_size'] = int(data.get('max_cluster_size', clustering.DEFAULT_MAX_CLUSTER_SIZE))
+        if params['max_cluster_size'] <= 0:
+            raise ValueError('max_cluster_size must be positive')
+        params['method'] = data.get('cluster_method', 'kmeans')
+        if params['method'] not in clustering.CLUSTER_METHODS:
+            raise ValueError(f"cluster_method must be one of: {', '.join(clustering.CLUSTER_METHODS)}")
+    elif mode == 'tsp' and data.get('portfolio'):
+        params['portfolio'] = parse_portfolio(data['portfolio'])
+        if data.get('neighbors') is not None:
+            raise ValueError('portfolio cannot be combined with neighbors')
+    elif mode == 'tsp' and data.get('neighbors') is not None:
+        try:
+            params['neighbors'] = int(data['neighbors'])
+        except (TypeError, ValueError):
+            params['neighbors'] = 0
+        if params['neighbors'] <= 0:
+            raise ValueError('neighbors must be a positive integer')
+        if cost_provider.path is not None:
+            # Its arc set is priced by straight-line distance only
+            raise ValueError('neighbors is not available with a road network (ROAD_NETWORK_PATH)')
+    return params
+
+
+def run_solve(fn, distance_matrix, *args, **kwargs):
+    """Call fn(distance_matrix, ...) on the solver pool, handing the matrix over in shared memory."""
+    if solver_pool is None:
+        return fn(distance_matrix, *args, **kwargs)
+    with share_array(distance_matrix) as shared:
+        return solver_pool.run(fn, shared, *args, **kwargs)
+
+
+def solve_route_request(mode, lats, lngs, route_params, solve_options):
+    """Solve a tsp / cluster request, on the solver pool when it is enabled."""
+    if mode == 'cluster':
+        # Cluster mode already fans its sub-tours out over processes, which
+        # build their own matrices from the cost provider
+        return route_solvers.solve_route(mode, lats, lngs, route_params, solve_options,
+                                         matrix_for=cost_provider.matrix, processes=SOLVE_PROCESSES)
+    if solver_pool is None:
+        return route_solvers.solve_route(mode, lats, lngs, route_params, solve_options,
+                                         matrix_for=distance_matrix_for, processes=SOLVE_PROCESSES)
+    if route_params.get('portfolio'):
+        # Each strategy takes its own worker from the pool
+        options = {k: v for k, v in solve_options.items() if k not in ('metaheuristic', 'first_solution')}
+        return portfolio.solve_portfolio(distance_matrix_for(lats, lngs), route_params['portfolio'],
+                               pool=solver_pool, **options)
+    if route_params.get('neighbors'):
+        return solver_pool.run(route_solvers.solve_route, mode, lats, lngs, route_params, solve_options)
+    return run_solve(solver.solve_tsp, distance_matrix_for(lats, lngs), **solve_options)
+
+
+def record_solve_stages(solve_stats):
+    """Split a solver's reported time into the setup and solve stages of this request."""
+    setup_ms = solve_stats.get('setup_ms') or 0
+    metrics.record('setup', setup_ms / 1000)
+    metrics.record('solve', (solve_stats['solve_time_ms'] - setup_ms) / 1000)
+
+
+@app.errorhandler(PoolBusy)
+def solver_busy(e):
+    response = jsonify({
+        'error': 'Solver busy',
+        'message': str(e),
+        'retry_after': e.retry_after
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+
+def distance_matrix_for(lats, lngs):
+    """Dense distance matrix, remembered so /api/route/reoptimize can patch it later."""
+    with metrics.stage('matrix'):
+        distance_matrix = cost_provider.matrix(lats, lngs)
+    if len(lats) <= MAX_CACHED_MATRIX_STOPS:
+        matrix_cache.put(matrix_key(lats, lngs), distance_matrix)
+    return distance_matrix
+
+
+def stop_properties(location, **extra):
+    """GeoJSON properties of a stop: its request fields minus the coordinates."""
+    return {**{k: v for k, v in location.items() if k not in COORDINATE_KEYS}, **extra}
+
+
+def route_polyline(lats, lngs, route):
+    """Encoded polyline of a route, back to its start, for format=polyline."""
+    closed = route_indices(route)
+    return {'polyline': encode_polyline(lats[closed], lngs[closed]), 'polyline_precision': POLYLINE_PRECISION}
+
+
+def route_geojson(mode, locations, lats, lngs, route, total_distance):
+    """Streamed format=geojson body of a tsp / cluster route: the stops in order, then the path."""
+    stops = [0] + [point_idx for point_idx in route if point_idx != 0]
+    properties = [stop_properties(locations[point_idx], route_order=i) for i, point_idx in enumerate(stops)]
+    lines = [(route_indices(route), {'mode': mode, 'total_distance': round(total_distance, 2)})]
+    body = iter_geojson(lats, lngs, stops, properties, lines)
+    return Response(stream_with_context(body), mimetype='application/geo+json')
+
+
+def route_response(mode, locations, route, total_distance, solve_stats):
+    """Body of a successful tsp / cluster /api/route response."""
+    if mode == 'cluster':
+        # Depot revisits between clusters are in `route`, not in the deliveries
+        ordered = [point_idx for point_idx in route if point_idx != 0]
+    else:
+        # Skip the first point (depot) in the returned deliveries
+        ordered = route[1:]
+
+    response = {
+        'total_distance': round(total_distance, 2),
+        'total_points': len(route),
+        'route': route,
+        'objective': solve_stats['objective'],
+        'solve_time_ms': solve_stats['solve_time_ms'],
+        'metaheuristic': solve_stats['metaheuristic'],
+        'ordered_deliveries': [
+            {**locations[point_idx], 'route_order': i}
+            for i, point_idx in enumerate(ordered, 1)  # Start indexing from 1
+        ]
+    }
+    if mode == 'cluster':
+        # Trips back to the depot between clusters are in `route` but are not points
+        depot_returns = route[1:-1].count(0)
+        response['mode'] = 'cluster'
+        response['clusters'] = solve_stats['clusters']
+        response['depot_returns'] = depot_returns
+        response['total_points'] = len(route) - depot_returns
+    if 'portfolio' in solve_stats:
+        response['strategy'] = solve_stats['strategy']
+        response['portfolio'] = solve_stats['portfolio']
+    return response
 
 
 @app.route("/api/route", methods=["POST"])
@@ -127,7 +602,8 @@ def optimize_route():
     
     try:
         # Get delivery points from request
-        data = request.json
+        with metrics.stage('parse'):
+            data = request.json
         logger.info(f"Request data type: {type(data)}")
         
         if not data:
@@ -150,37 +626,109 @@ def optimize_route():
                 'error': 'No deliveries provided',
                 'message': 'At least one delivery point is required'
             }), 400
+
+        mode = data.get('mode', 'tsp')
+        if mode not in ROUTE_MODES:
+            return jsonify({
+                'error': 'Invalid mode',
+                'message': f"mode must be one of: {', '.join(ROUTE_MODES)}"
+            }), 400
+        output = data.get('format', 'json')
+        if output not in ROUTE_FORMATS:
+            return jsonify({
+                'error': 'Invalid format',
+                'message': f"format must be one of: {', '.join(ROUTE_FORMATS)}"
+            }), 400
+        if mode == 'tsp' and len(deliveries) > MAX_DENSE_STOPS:
+            # A dense matrix and a single model no longer fit; decompose instead
+            mode = 'cluster'
             
+        try:
+            solve_options = parse_solve_options(data)
+            route_params = parse_route_params(data, mode)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid solver options',
+                'message': str(e)
+            }), 400
+
         # Create a list of all locations (source + deliveries)
         locations = [source_point] + deliveries
-        
-        # Create distance matrix
-        distance_matrix = create_distance_matrix(locations)
-        
-        # Solve TSP
-        route, total_distance = solve_tsp(distance_matrix)
+        lats, lngs = location_coordinates(locations)
+
+        if mode == 'vrp':
+            if data.get('job'):
+                return jsonify({
+                    'error': 'Invalid mode',
+                    'message': "job mode supports the tsp and cluster modes"
+                }), 400
+            with metrics.stage('matrix'):
+                distance_matrix = cost_provider.matrix(lats, lngs)
+                drive_minutes = cost_provider.travel_minutes(lats, lngs)
+            return optimize_fleet_routes(data, locations, distance_matrix, solve_options, drive_minutes, output)
+
+        if data.get('job'):
+            if output != 'json':
+                return jsonify({
+                    'error': 'Invalid format',
+                    'message': "job results are only available as json"
+                }), 400
+            job_id = job_queue.submit(route_solvers.solve_route, mode, lats, lngs, route_params, solve_options,
+                                      matrix_for=cost_provider.matrix,
+                                      context={'mode': mode, 'locations': locations})
+            logger.info(f"Queued route job {job_id} ({mode}, {len(deliveries)} deliveries)")
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f"/api/route/jobs/{job_id}",
+                'events_url': f"/api/route/jobs/{job_id}/events"
+            }), 202
+
+        cached = cache_key = None
+        if data.get('cache', True):
+            cache_key, order = route_key((lats[0], lngs[0]), lats[1:], lngs[1:],
+                                         {'mode': mode, 'costs': cost_provider.key, **route_params, **solve_options})
+            cached = route_cache.get(cache_key)
+
+        if cached:
+            route = from_canonical(cached['route'], order)
+            total_distance = cached['total_distance']
+            solve_stats = cached['stats']
+        else:
+            route, total_distance, solve_stats = solve_route_request(
+                mode, lats, lngs, route_params, solve_options)
+            if solve_stats.get('solve_time_ms') is not None:
+                record_solve_stages(solve_stats)
+            if route and cache_key:
+                route_cache.put(cache_key, {
+                    'route': to_canonical(route, order),
+                    'total_distance': total_distance,
+                    'stats': solve_stats
+                })
         
         if not route:
             return jsonify({
                 'error': 'Failed to find optimal route',
                 'message': 'The route optimizer could not find a solution'
             }), 400
-            
-        # Create response
-        response = {
-            'total_distance': round(total_distance, 2),
-            'total_points': len(route),
-            'route': route,
-            'ordered_deliveries': [
-                # Skip the first point (depot) in the returned deliveries
-                {**locations[point_idx], 'route_order': i}
-                for i, point_idx in enumerate(route[1:], 1)  # Start indexing from 1
-            ]
-        }
-        
-        logger.info(f"Route optimization successful: {len(route)} points, {total_distance:.2f} km")
-        return jsonify(response), 200
-        
+
+        if output == 'geojson':
+            logger.info(f"Route optimization successful ({mode}), streaming GeoJSON for {len(route)} points")
+            return route_geojson(mode, locations, lats, lngs, route, total_distance)
+
+        response = route_response(mode, locations, route, total_distance, solve_stats)
+        response['cache'] = {'hit': bool(cached), **route_cache.stats()}
+        if output == 'polyline':
+            del response['ordered_deliveries']
+            response.update(route_polyline(lats, lngs, route))
+
+        logger.info(f"Route optimization successful ({mode}, cache {'hit' if cached else 'miss'}): "
+                    f"{len(route)} points, {total_distance:.2f} km in {solve_stats['solve_time_ms']} ms")
+        with metrics.stage('serialize'):
+            return jsonify(response), 200
+
+    except PoolBusy:
+        raise
     except Exception as e:
         logger.error(f"Error in route optimization: {str(e)}")
         return jsonify({
@@ -189,84 +737,242 @@ def optimize_route():
         }), 500
 
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points on earth."""
-    R = 6371.0  # Earth radius in kilometers
-    
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance
+def job_status(job):
+    """Public view of a job record: status, best tour so far, and the final response."""
+    mode = job['context']['mode']
+    locations = job['context']['locations']
+    status = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'mode': mode,
+        'progress': job['progress'],
+    }
+    if job['best']:
+        status['best'] = {
+            'objective': job['best']['objective'],
+            'total_distance': round(job['best']['objective'] / 1000.0, 2),
+            'route': job['best']['route'],
+            'elapsed_ms': job['best']['elapsed_ms']
+        }
+    if job['error']:
+        status['error'] = 'Route optimization failed'
+        status['message'] = job['error']
+    elif job['result'] is not None:
+        route, total_distance, solve_stats = job['result']
+        if route:
+            status['result'] = route_response(mode, locations, route, total_distance, solve_stats)
+        else:
+            status['error'] = 'Failed to find optimal route'
+            status['message'] = 'The route optimizer could not find a solution'
+    return status
 
 
-def create_distance_matrix(locations):
-    """Create a matrix of distances between all locations."""
-    num_locations = len(locations)
-    distance_matrix = np.zeros((num_locations, num_locations))
-    
-    for i in range(num_locations):
-        for j in range(num_locations):
-            if i != j:
-                # Extract coordinates - handle both lat/lng and latitude/longitude formats
-                lat1 = locations[i].get('lat', locations[i].get('latitude', 0))
-                lon1 = locations[i].get('lng', locations[i].get('longitude', 0))
-                lat2 = locations[j].get('lat', locations[j].get('latitude', 0))
-                lon2 = locations[j].get('lng', locations[j].get('longitude', 0))
-                
-                # Calculate distance
-                distance_matrix[i][j] = haversine_distance(lat1, lon1, lat2, lon2)
-    
-    return distance_matrix
+@app.route("/api/route/jobs/<job_id>")
+def route_job(job_id):
+    """Poll a route job; `best` is the best tour found so far while it runs."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Unknown job',
+            'message': f"No route job {job_id} (it may have expired)"
+        }), 404
+    return jsonify(job_status(job)), 200
 
 
-def solve_tsp(distance_matrix):
-    """Solve the Traveling Salesman Problem using OR-Tools."""
-    num_locations = len(distance_matrix)
-    
-    # Create routing model
-    manager = pywrapcp.RoutingIndexManager(num_locations, 1, 0)
-    routing = pywrapcp.RoutingModel(manager)
-    
-    # Define distance callback
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return int(distance_matrix[from_node][to_node] * 1000)  # Convert to meters for integer precision
-    
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-    
-    # Set search parameters
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-    search_parameters.time_limit.seconds = 30
-    
-    # Solve the problem
-    solution = routing.SolveWithParameters(search_parameters)
-    
-    if not solution:
-        return None, None
-    
-    # Extract the route
-    route = []
-    index = routing.Start(0)
-    while not routing.IsEnd(index):
-        route.append(manager.IndexToNode(index))
-        index = solution.Value(routing.NextVar(index))
-    route.append(manager.IndexToNode(index))  # Add the depot at the end to complete the loop
-    
-    # Calculate total distance
-    total_distance = solution.ObjectiveValue() / 1000.0  # Convert back to kilometers
-    
-    return route, total_distance
+@app.route("/api/route/jobs/<job_id>/events")
+def route_job_events(job_id):
+    """Server-sent events: a `progress` event per improving objective, then `done` or `failed`."""
+    if job_queue.get(job_id) is None:
+        return jsonify({
+            'error': 'Unknown job',
+            'message': f"No route job {job_id} (it may have expired)"
+        }), 404
+
+    def events():
+        seen = 0
+        while True:
+            job = job_queue.wait(job_id, seen, SSE_HEARTBEAT_S)
+            if job is None:
+                return
+            for event in job['progress'][seen:]:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            if len(job['progress']) == seen and job['status'] not in FINISHED:
+                yield ": keep-alive\n\n"
+            seen = len(job['progress'])
+            if job['status'] in FINISHED:
+                yield f"event: {job['status']}\ndata: {json.dumps(job_status(job))}\n\n"
+                return
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route("/api/route/reoptimize", methods=["POST"])
+def reoptimize_route():
+    """Re-solve a route after stops were added to or removed from it.
+
+    Body: the `deliveries` and `route` of a previous /api/route (tsp) response,
+    `removed` (0-based indices into those deliveries) and `added` (new delivery
+    dicts), plus the usual solver options. The previous tour, minus removed
+    stops and with added ones inserted cheaply, warm-starts the search; the
+    previous distance matrix is reused when this worker still has it.
+    """
+    logger.info("Received route re-optimization request")
+    data = request.get_json(silent=True) or {}
+    deliveries = data.get('deliveries') or []
+    previous_route = data.get('route') or []
+    added = data.get('added') or []
+    source_point = data.get('source_point', {'lat': 22.5, 'lng': 88.4})
+
+    try:
+        if not isinstance(deliveries, list) or not isinstance(added, list):
+            raise ValueError('deliveries and added must be lists of delivery objects')
+        if not all(isinstance(location, dict) for location in [source_point, *deliveries, *added]):
+            raise ValueError('source_point, deliveries and added must be objects with lat and lng')
+        old_lats, old_lngs = location_coordinates([source_point] + deliveries)
+        location_coordinates(added)  # raises on non-numeric coordinates
+        removed = {int(i) for i in data.get('removed') or []}
+        if any(i < 0 or i >= len(deliveries) for i in removed):
+            raise ValueError('removed must index into deliveries')
+        previous_route = [int(node) for node in previous_route]
+        if (len(previous_route) != len(deliveries) + 2 or previous_route[0] != 0 or previous_route[-1] != 0
+                or sorted(previous_route[1:-1]) != list(range(1, len(deliveries) + 1))):
+            raise ValueError('route must be the tsp route returned for these deliveries')
+        solve_options = parse_solve_options(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'error': 'Invalid re-optimization request',
+            'message': str(e)
+        }), 400
+    solve_options.setdefault('time_limit_ms', REOPTIMIZE_TIME_LIMIT_MS)
+    solve_options.setdefault('metaheuristic', 'GREEDY_DESCENT')
+
+    # Old location indices that survive, in their new order (depot first)
+    keep = [0] + [i + 1 for i in range(len(deliveries)) if i not in removed]
+    new_deliveries = [deliveries[i - 1] for i in keep[1:]] + list(added)
+    if not new_deliveries:
+        return jsonify({
+            'error': 'No deliveries provided',
+            'message': 'At least one delivery point is required'
+        }), 400
+    locations = [source_point] + new_deliveries
+    lats, lngs = location_coordinates(locations)
+
+    previous_matrix = matrix_cache.get(matrix_key(old_lats, old_lngs))
+    # The patch computes haversine rows, so road-network matrices are rebuilt whole
+    if previous_matrix is not None and cost_provider.path is None:
+        with metrics.stage('matrix'):
+            distance_matrix = update_distance_matrix(previous_matrix, keep, lats, lngs)
+        if len(lats) <= MAX_CACHED_MATRIX_STOPS:
+            matrix_cache.put(matrix_key(lats, lngs), distance_matrix)
+    else:
+        distance_matrix = distance_matrix_for(lats, lngs)
+
+    new_index = {old: new for new, old in enumerate(keep)}
+    hint = [new_index[node] for node in previous_route if node in new_index]
+    hint = solver.insert_cheapest(hint, range(len(keep), len(locations)), distance_matrix)
+
+    route, total_distance, solve_stats = run_solve(
+        solver.solve_tsp, distance_matrix, initial_route=hint, **solve_options)
+    record_solve_stages(solve_stats)
+    if not route:
+        return jsonify({
+            'error': 'Failed to find optimal route',
+            'message': 'The route optimizer could not find a solution'
+        }), 400
+
+    logger.info(f"Route re-optimization successful: -{len(removed)} +{len(added)} stops, "
+                f"{total_distance:.2f} km in {solve_stats['solve_time_ms']} ms")
+    return jsonify({
+        'total_distance': round(total_distance, 2),
+        'total_points': len(route),
+        'route': route,
+        'objective': solve_stats['objective'],
+        'solve_time_ms': solve_stats['solve_time_ms'],
+        'metaheuristic': solve_stats['metaheuristic'],
+        'matrix_reused': previous_matrix is not None,
+        # `route` indexes into these; send them back with the next diff
+        'deliveries': new_deliveries,
+        'ordered_deliveries': [
+            {**locations[point_idx], 'route_order': i}
+            for i, point_idx in enumerate(route[1:], 1)
+        ]
+    }), 200
+
+
+def optimize_fleet_routes(data, locations, distance_matrix, solve_options, drive_minutes=None, output='json'):
+    """Answer a mode='vrp' /api/route request: one capacitated, time-windowed route per vehicle."""
+    deliveries = locations[1:]
+    try:
+        demands = [0] + [vrp.delivery_quantity(d) for d in deliveries]
+        time_windows = [None] + [vrp.delivery_time_window(d) for d in deliveries]
+        capacities = vrp.vehicle_capacities_from(data, sum(demands))
+        shift = vrp.shift_from(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'error': 'Invalid fleet request',
+            'message': str(e)
+        }), 400
+
+    result = run_solve(vrp.solve_vrp, distance_matrix, demands, capacities, time_windows,
+                       shift=shift, drive_minutes=drive_minutes, **solve_options)
+    if result is None:
+        return jsonify({
+            'error': 'Failed to find optimal route',
+            'message': 'The route optimizer could not find a solution'
+        }), 400
+    record_solve_stages(result)
+
+    routes = []
+    for vehicle_route in result['routes']:
+        route = vehicle_route['route']
+        arrivals = vehicle_route['arrival_minutes']
+        routes.append({
+            'vehicle': vehicle_route['vehicle'],
+            'capacity': vehicle_route['capacity'],
+            'load': vehicle_route['load'],
+            'total_distance': round(vehicle_route['distance'], 2),
+            'route': route,
+            'ordered_deliveries': [
+                {**locations[point_idx], 'route_order': i, 'eta': vrp.format_clock(arrivals[i])}
+                for i, point_idx in enumerate(route[1:-1], 1)
+            ]
+        })
+
+    logger.info(f"Fleet routing successful: {len(capacities)} vehicles, "
+                f"{len(result['dropped'])} dropped, {result['total_distance']:.2f} km")
+    if output == 'geojson':
+        return fleet_geojson(locations, result['routes'])
+    if output == 'polyline':
+        lats, lngs = location_coordinates(locations)
+        for vehicle_route in routes:
+            etas = [delivery['eta'] for delivery in vehicle_route.pop('ordered_deliveries')]
+            vehicle_route.update(route_polyline(lats, lngs, vehicle_route['route']), etas=etas)
+    return jsonify({
+        'mode': 'vrp',
+        'total_distance': round(result['total_distance'], 2),
+        'objective': result['objective'],
+        'solve_time_ms': result['solve_time_ms'],
+        'metaheuristic': result['metaheuristic'],
+        'routes': routes,
+        'dropped_deliveries': [locations[i] for i in result['dropped']]
+    }), 200
+
+
+def fleet_geojson(locations, vehicle_routes):
+    """Streamed format=geojson body of a vrp solve: the depot, each vehicle's stops, one path per vehicle."""
+    lats, lngs = location_coordinates(locations)
+    stops, properties, lines = [0], [stop_properties(locations[0], route_order=0)], []
+    for vehicle_route in vehicle_routes:
+        route, arrivals = vehicle_route['route'], vehicle_route['arrival_minutes']
+        for i, point_idx in enumerate(route[1:-1], 1):
+            stops.append(point_idx)
+            properties.append(stop_properties(locations[point_idx], vehicle=vehicle_route['vehicle'],
+                                              route_order=i, eta=vrp.format_clock(arrivals[i])))
+        lines.append((route, {'vehicle': vehicle_route['vehicle'], 'load': vehicle_route['load'],
+                              'total_distance': round(vehicle_route['distance'], 2)}))
+    body = iter_geojson(lats, lngs, stops, properties, lines)
+    return Response(stream_with_context(body), mimetype='application/geo+json')
 
 
 def get_default_order():
@@ -289,7 +995,34 @@ def get_default_order():
         'Parcel Delivered in This Slot': '12:00 PM - 03:00 PM'
     }
 
+def warm_up():
+    """Load every model and run one prediction through each, then mark the app ready.
+
+    Eager startup runs this on import. In lazy mode gunicorn.conf.py runs it in
+    the master before workers fork (and `python app.py` before serving).
+    """
+    if ready.is_set():
+        return
+    started = time.perf_counter()
+    model_registry.load_all()
+    y_encoder = model_registry.encoders()['y_encoder']
+    for name in model_registry.available():
+        try:
+            predict_delivery_slot(get_default_order(), model_registry.get(name), y_encoder)
+        except OSError:
+            # Missing model; load_all has logged it
+            continue
+        except Exception as e:
+            logger.error(f"Warm-up prediction with model '{name}' failed: {e}")
+    ready.set()
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f} s ({STARTUP_MODE} startup)")
+
+
+if STARTUP_MODE == 'eager':
+    warm_up()
+
 if __name__ == "__main__":
+    warm_up()
     # Get port from environment variable (Railway) or default to 5000
     port = int(os.environ.get('PORT', 5000))
     print(f"Starting Savitr AI API server on http://0.0.0.0:{port}")
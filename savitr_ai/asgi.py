@@ -0,0 +1,333 @@
+"""ASGI entry point: the Flask app's endpoints and handlers served from an asyncio loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+
+Under sync gunicorn a cheap /health or /api/slot call can sit behind CPU-heavy
+route solves. Here the event loop only reads requests and writes responses;
+each request runs the unchanged Flask handler in the lane for its endpoint:
+
+- inline: /health and /metrics, called on the loop itself (sub-millisecond)
+- slot: /api/slot*, in a thread pool
+- route: synchronous POST /api/route and /api/route/reoptimize, in a process
+  pool whose workers run at a lower CPU priority and solve in-process, so
+  solves saturating the cores do not starve the loop
+- io: everything else (job submission, polling and SSE streams, geocoding),
+  in a thread pool; job state lives in this process
+
+Each lane admits at most `limit + queue` requests at once and answers 429
+beyond that. A route worker that dies (e.g. OOM) takes its pool down; the
+pool is replaced and the request retried once, then answered 503. Route
+responses are built whole in the worker; the other lanes stream. Route
+workers keep their own route and matrix caches (ROUTE_CACHE_PATH shares
+solved routes between them), and their stage timings do not reach /metrics,
+which reports this process only. A route worker never starts processes of
+its own: cluster and portfolio solves run their parts one after another. Lane sizes come from
+ASGI_SLOT_THREADS, ASGI_IO_THREADS, ASGI_ROUTE_WORKERS, ASGI_ROUTE_QUEUE and
+ASGI_ROUTE_NICE.
+"""
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Like gunicorn.conf.py: the routing stack is not imported in this process
+os.environ.setdefault('STARTUP_MODE', 'lazy')
+
+from startup import LazyModule  # noqa: E402
+
+# Imported on first use: a route worker imports this module to unpickle its
+# initializer, which has to set the worker's environment before app reads it
+flask_app_module = LazyModule('app')
+
+logger = logging.getLogger(__name__)
+
+INLINE_PATHS = ('/health', '/metrics')
+ROUTE_PATHS = ('/api/route', '/api/route/reoptimize')
+DEFAULT_SLOT_THREADS = 8
+DEFAULT_IO_THREADS = 16
+# Requests allowed to wait for a route worker, per worker
+DEFAULT_ROUTE_QUEUE_PER_WORKER = 2
+# Scheduling priority of route workers relative to the loop's process
+DEFAULT_ROUTE_NICE = 10
+
+
+class LaneBusy(Exception):
+    pass
+
+
+class Lane:
+    """An executor plus the admission limit of the endpoints routed to it."""
+
+    def __init__(self, name, executor, limit, queue=0):
+        self.name = name
+        self.executor = executor
+        self.limit = limit
+        self.queue = queue
+        self.in_flight = 0
+
+    def admit(self):
+        if self.in_flight >= self.limit + self.queue:
+            raise LaneBusy(self.name)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+
+def _init_route_worker(nice):
+    # This process is the route pool: solve here rather than in a nested solver
+    # pool, and solve clusters and portfolio members serially
+    os.environ['SOLVER_WORKERS'] = '0'
+    os.environ['SOLVE_PROCESSES'] = '1'
+    os.environ['STARTUP_MODE'] = 'lazy'
+    if nice:
+        os.nice(nice)
+    import app  # noqa: F401
+    import route_solvers  # noqa: F401
+    import vrp  # noqa: F401
+
+
+def wsgi_environ(request, body):
+    """WSGI environ for an ASGI http scope (or the picklable subset of one) and its body."""
+    server = request.get('server') or ('localhost', 80)
+    client = request.get('client')
+    environ = {
+        'REQUEST_METHOD': request['method'],
+        'SCRIPT_NAME': request.get('root_path', ''),
+        'PATH_INFO': request['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': request['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{request.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in request['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+def call_wsgi(request, body):
+    """Run the Flask app on one request; (start message, body bytes)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['message'] = _start_message(status, headers)
+
+    result = flask_app_module.app(wsgi_environ(request, body), start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['message'], content
+
+
+def _picklable(scope):
+    return {key: scope[key] for key in ('method', 'path', 'root_path', 'query_string', 'headers',
+                                        'server', 'client', 'http_version', 'scheme') if key in scope}
+
+
+def _stream_wsgi(scope, body, loop, send, disconnected):
+    """Run the Flask app in this thread, sending the response through the loop as it is produced."""
+    def post(message):
+        if disconnected.is_set():
+            raise ConnectionAbortedError('client disconnected')
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['message'] = _start_message(status, headers)
+
+    result = flask_app_module.app(wsgi_environ(scope, body), start_response)
+    try:
+        post(started['message'])
+        for chunk in result:
+            if chunk:
+                post({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        post({'type': 'http.response.body', 'body': b''})
+    except ConnectionAbortedError:
+        # Closing the iterable below stops a streaming generator (e.g. SSE)
+        pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def _is_job(body):
+    # Only parse bodies that can contain the flag; most route bodies are large
+    if b'"job"' not in body:
+        return False
+    try:
+        return bool(json.loads(body).get('job'))
+    except (ValueError, AttributeError):
+        return False
+
+
+class AsgiApp:
+    def __init__(self, slot_threads=DEFAULT_SLOT_THREADS, io_threads=DEFAULT_IO_THREADS,
+                 route_workers=None, route_queue=None, route_nice=DEFAULT_ROUTE_NICE):
+        route_workers = route_workers or os.cpu_count() or 1
+        if route_queue is None:
+            route_queue = DEFAULT_ROUTE_QUEUE_PER_WORKER * route_workers
+        self.route_nice = route_nice
+        self.lanes = {
+            'slot': Lane('slot', ThreadPoolExecutor(slot_threads, thread_name_prefix='slot'), slot_threads),
+            'io': Lane('io', ThreadPoolExecutor(io_threads, thread_name_prefix='io'), io_threads),
+            # Created at startup, after the event loop is running
+            'route': Lane('route', None, route_workers, route_queue),
+        }
+
+    def lane_for(self, scope, body):
+        path = scope['path']
+        if path in INLINE_PATHS:
+            return None
+        if path.startswith('/api/slot'):
+            return self.lanes['slot']
+        if scope['method'] == 'POST' and path in ROUTE_PATHS and not _is_job(body):
+            return self.lanes['route']
+        return self.lanes['io']
+
+    def route_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.lanes['route'].limit, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_route_worker, initargs=(self.route_nice,))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                loop = asyncio.get_running_loop()
+                self.lanes['route'].executor = self.route_pool()
+                # Models are loaded here; the server accepts connections once this returns
+                await loop.run_in_executor(self.lanes['io'].executor, flask_app_module.warm_up)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for lane in self.lanes.values():
+                    if lane.executor is not None:
+                        lane.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body = b''.join(chunks)
+
+        lane = self.lane_for(scope, body)
+        if lane is None:
+            start, content = call_wsgi(scope, body)
+            await send(start)
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        try:
+            lane.admit()
+        except LaneBusy:
+            await self.busy(lane, send)
+            return
+        try:
+            if lane.name == 'route':
+                await self.solve(lane, scope, body, send)
+            else:
+                await self.stream(lane, scope, body, receive, send)
+        finally:
+            lane.release()
+
+    async def solve(self, lane, scope, body, send):
+        loop = asyncio.get_running_loop()
+        request = _picklable(scope)
+        for _ in range(2):
+            pool = lane.executor
+            try:
+                start, content = await loop.run_in_executor(pool, call_wsgi, request, body)
+                break
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); replace the pool, once per broken pool, and retry once
+                if lane.executor is pool:
+                    logger.error("Route worker died, restarting the route pool")
+                    lane.executor = self.route_pool()
+                    pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            await self.error(send, 503, 'Solver unavailable', 'The route solver restarted, retry shortly')
+            return
+        await send(start)
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def stream(self, lane, scope, body, receive, send):
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await loop.run_in_executor(lane.executor, _stream_wsgi, scope, body, loop, send, disconnected)
+        finally:
+            watcher.cancel()
+
+    async def busy(self, lane, send):
+        await self.error(send, 429, 'Server busy', f"Too many concurrent {lane.name} requests, retry shortly")
+
+    async def error(self, send, status, error, message):
+        body = json.dumps({'error': error, 'message': message, 'retry_after': 1}).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'retry-after', b'1')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def asgi_app_from_env():
+    """AsgiApp sized by ASGI_SLOT_THREADS / ASGI_IO_THREADS / ASGI_ROUTE_WORKERS / ASGI_ROUTE_QUEUE / ASGI_ROUTE_NICE."""
+    queue = os.environ.get('ASGI_ROUTE_QUEUE')
+    return AsgiApp(
+        slot_threads=int(os.environ.get('ASGI_SLOT_THREADS', DEFAULT_SLOT_THREADS)),
+        io_threads=int(os.environ.get('ASGI_IO_THREADS', DEFAULT_IO_THREADS)),
+        route_workers=int(os.environ.get('ASGI_ROUTE_WORKERS', 0)) or None,
+        route_queue=int(queue) if queue is not None else None,
+        route_nice=int(os.environ.get('ASGI_ROUTE_NICE', DEFAULT_ROUTE_NICE)),
+    )
+
+
+app = asgi_app_from_env()
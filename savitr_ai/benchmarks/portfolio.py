@@ -0,0 +1,75 @@
+"""Compare the strategy portfolio with today's single solve under the same wall-clock limit.
+
+For each stop layout the default single run (PATH_CHEAPEST_ARC + the size-based
+metaheuristic) and the portfolio get the same time limit; the portfolio races
+its members in parallel, so it needs one core per member to get the full
+budget for each.
+
+    python benchmarks/portfolio.py --stops 300 800 --seconds 5
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance import haversine_matrix  # noqa: E402
+from portfolio import DEFAULT_PORTFOLIO, solve_portfolio  # noqa: E402
+from solver import solve_tsp  # noqa: E402
+from solver_pool import SolverPool  # noqa: E402
+from solver_transit import DEPOT, random_stops  # noqa: E402
+
+
+def clustered_stops(n, seed=0, centers=8, spread=0.15):
+    """Stops bunched around a few hot spots, where savings-style starts tend to win."""
+    rng = np.random.default_rng(seed)
+    hubs = rng.uniform(-spread, spread, (centers, 2))
+    picks = hubs[rng.integers(centers, size=n)] + rng.normal(0, spread / 20, (n, 2))
+    lats, lngs = DEPOT[0] + picks[:, 0], DEPOT[1] + picks[:, 1]
+    lats[0], lngs[0] = DEPOT
+    return lats, lngs
+
+
+LAYOUTS = {'uniform': random_stops, 'clustered': clustered_stops}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stops', type=int, nargs='+', default=[300, 800])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print one JSON object per run')
+    args = parser.parse_args()
+
+    time_limit_ms = int(args.seconds * 1000)
+    pool = SolverPool(max_workers=len(DEFAULT_PORTFOLIO), max_queue=0)
+    for layout, make_stops in LAYOUTS.items():
+        for n in args.stops:
+            distance_matrix = haversine_matrix(*make_stops(n, args.seed))
+            _, single_km, single = solve_tsp(distance_matrix, time_limit_ms=time_limit_ms, no_improvement_ms=0)
+            _, portfolio_km, stats = solve_portfolio(distance_matrix, pool=pool, time_limit_ms=time_limit_ms,
+                                                     no_improvement_ms=0)
+            result = {
+                'layout': layout,
+                'stops': n,
+                'single_km': round(single_km, 3),
+                'single_ms': single['solve_time_ms'],
+                'portfolio_km': round(portfolio_km, 3),
+                'portfolio_ms': stats['solve_time_ms'],
+                'winner': stats['strategy'],
+                'gain_pct': round(100 * (single_km - portfolio_km) / single_km, 2),
+            }
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{layout:>9} n={n:<5} single {result['single_km']:>9.3f} km  "
+                      f"portfolio {result['portfolio_km']:>9.3f} km ({result['gain_pct']:+.2f}%)  "
+                      f"won by {result['winner']}")
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Measure /api/route-style solve throughput through the solver process pool.
+
+Each run submits the same number of TSP solves from as many threads as there
+are pool slots and reports completed solves per second, so the scaling with
+--workers can be read off directly. Every solve does a fixed amount of work
+(greedy descent to its local optimum, with the time limit and no-improvement
+stop out of the way); a wall-clock budget would make throughput look linear
+even on one core.
+
+    python benchmarks/solver_pool.py --workers 1 2 4 8 --solves 32 --stops 300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance import haversine_matrix  # noqa: E402
+from solver import solve_tsp  # noqa: E402
+from solver_pool import SolverPool, share_array  # noqa: E402
+from solver_transit import random_stops  # noqa: E402
+
+
+def run(workers, solves, distance_matrix):
+    pool = SolverPool(max_workers=workers, max_queue=solves)
+    # Start the worker processes outside the timed region
+    list(ThreadPoolExecutor(workers).map(
+        lambda _: pool.run(solve_tsp, haversine_matrix([0.0, 0.1], [0.0, 0.1]), solution_limit=1),
+        range(workers)))
+
+    def solve(_):
+        with share_array(distance_matrix) as shared:
+            return pool.run(solve_tsp, shared, metaheuristic='GREEDY_DESCENT',
+                            time_limit_ms=600000, no_improvement_ms=0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(solves) as threads:
+        results = list(threads.map(solve, range(solves)))
+    elapsed = time.perf_counter() - started
+    return {
+        'workers': workers,
+        'solves': solves,
+        'seconds': round(elapsed, 2),
+        'solves_per_s': round(solves / elapsed, 3),
+        'mean_km': round(sum(km for _, km, _ in results) / solves, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--solves', type=int, default=16)
+    parser.add_argument('--stops', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print one JSON object per run')
+    args = parser.parse_args()
+
+    lats, lngs = random_stops(args.stops, args.seed)
+    distance_matrix = haversine_matrix(lats, lngs)
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args.solves, distance_matrix)
+        baseline = baseline or result['solves_per_s']
+        result['speedup'] = round(result['solves_per_s'] / baseline, 2)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"workers={workers:>3}  {result['solves_per_s']:>7.3f} solves/s  "
+                  f"x{result['speedup']:<5}  ({result['seconds']} s, mean {result['mean_km']} km)")
+
+
+if __name__ == '__main__':
+    main()
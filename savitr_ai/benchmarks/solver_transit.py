@@ -0,0 +1,90 @@
+"""Compare OR-Tools search throughput with a Python transit callback vs the native matrix.
+
+Both variants run guided local search for the same wall-clock budget on the
+same random stop set around the Kolkata depot. Every local-search move
+accepted by GLS produces a solution, so solutions per second is the solver
+iteration rate; search branches per second are reported alongside it.
+
+    python benchmarks/solver_transit.py --sizes 200 500 1000 --seconds 10
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance import haversine_matrix  # noqa: E402
+from solver import cost_matrix_meters, register_transit  # noqa: E402
+
+DEPOT = (22.5, 88.4)
+
+
+def random_stops(n, seed=0, spread=0.15):
+    rng = np.random.default_rng(seed)
+    lats = DEPOT[0] + rng.uniform(-spread, spread, n)
+    lngs = DEPOT[1] + rng.uniform(-spread, spread, n)
+    lats[0], lngs[0] = DEPOT
+    return lats, lngs
+
+
+def run(cost_matrix, transit, seconds):
+    manager = pywrapcp.RoutingIndexManager(len(cost_matrix), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    callback_index = register_transit(routing, manager, cost_matrix, transit)
+    routing.SetArcCostEvaluatorOfAllVehicles(callback_index)
+
+    solutions = [0]
+
+    def on_solution():
+        solutions[0] += 1
+
+    routing.AddAtSolutionCallback(on_solution)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.seconds = seconds
+
+    solution = routing.SolveWithParameters(params)
+    wall = routing.solver().WallTime() / 1000.0
+    return {
+        'transit': transit,
+        'objective_m': solution.ObjectiveValue() if solution else None,
+        'wall_s': round(wall, 3),
+        'branches_per_s': round(routing.solver().Branches() / wall, 1),
+        'iterations_per_s': round(solutions[0] / wall, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 500, 1000])
+    parser.add_argument('--seconds', type=int, default=10, help='search budget per run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        lats, lngs = random_stops(n, args.seed)
+        cost_matrix = cost_matrix_meters(haversine_matrix(lats, lngs))
+        rows = {transit: run(cost_matrix, transit, args.seconds) for transit in ('callback', 'matrix')}
+        speedup = rows['matrix']['iterations_per_s'] / max(rows['callback']['iterations_per_s'], 1e-9)
+        for row in rows.values():
+            row['stops'] = n
+            results.append(row)
+            print(f"{n:>6} stops  {row['transit']:<8}  {row['iterations_per_s']:>8.2f} iterations/s"
+                  f"  {row['branches_per_s']:>10,.0f} branches/s  objective {row['objective_m']}")
+        print(f"{n:>6} stops  matrix/callback speedup: {speedup:.2f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
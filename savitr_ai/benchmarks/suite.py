@@ -0,0 +1,386 @@
+"""Reproducible benchmark suite for the distance matrix, route solver and slot prediction.
+
+Every case runs in a fresh process so its peak RSS can be reported, on
+synthetic inputs generated from --seed: delivery sets of 10 to 10k stops
+around the Kolkata depot, and order batches in the Post.csv schema (category
+values drawn from Post.csv itself). Cases:
+
+    matrix       create_distance_matrix latency and cells/s
+    solver       solve_tsp (cluster-first solve_clustered above 3000 stops, as
+                 /api/route does) time and tour length vs. a nearest-neighbour
+                 reference tour; cluster tours also report the length without
+                 their depot returns (chained_km)
+    slot         GET /api/slot through the Flask test client, per model
+    slot_batch   POST /api/slot/batch rows/s (JSON and CSV bodies)
+    route        POST /api/route end to end
+
+Results are written as JSON; --compare flags latency and route-quality
+regressions against an earlier run and exits non-zero, for CI.
+
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --quick --output new.json --compare bench.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+DEPOT = (22.5, 88.4)
+SIZES = (10, 100, 1000, 5000, 10000)
+QUICK_SIZES = (10, 100, 1000)
+SOLVER_SIZES = (10, 100, 1000, 10000)
+QUICK_SOLVER_SIZES = (10, 100)
+ROUTE_SIZES = (10, 100, 500)
+BATCH_SIZES = (100, 10000)
+SLOT_MODELS = ('logistic_regression', 'knn', 'random_forest', 'xgboost')
+# Above this /api/route switches tsp requests to cluster mode (app.MAX_DENSE_STOPS)
+MAX_DENSE_STOPS = 3000
+# Latency ratio (new / old p50) and tour ratio above which --compare fails
+DEFAULT_LATENCY_TOLERANCE = 1.25
+DEFAULT_QUALITY_TOLERANCE = 1.01
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# -- synthetic inputs --------------------------------------------------------
+
+def delivery_set(n, seed=0, spread_km=15.0):
+    """n stops scattered around the depot (index 0 is the depot itself)."""
+    rng = np.random.default_rng(seed)
+    degrees = spread_km / 111.0
+    lats = DEPOT[0] + rng.normal(0, degrees / 2, n)
+    lngs = DEPOT[1] + rng.normal(0, degrees / 2, n)
+    lats[0], lngs[0] = DEPOT
+    return lats, lngs
+
+
+def order_batch(n, seed=0):
+    """n orders in the Post.csv column layout, with realistic category values."""
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(os.path.join(APP_DIR, 'Post.csv'))
+    order_dates = pd.Timestamp('2016-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, n), unit='min')
+    real = rng.integers(0, 7, n)
+    orders = pd.DataFrame({
+        'Days for shipping (real)': real,
+        'Days for shipment (scheduled)': rng.integers(0, 5, n),
+        'Delivery Status': rng.choice(sample['Delivery Status'].unique(), n),
+        'Customer Segment': rng.choice(sample['Customer Segment'].unique(), n),
+        'Latitude': DEPOT[0] + rng.normal(0, 0.1, n),
+        'Longitude': DEPOT[1] + rng.normal(0, 0.1, n),
+        'Order City': rng.choice(sample['Order City'].unique(), n),
+        'order date (DateOrders)': order_dates.strftime('%m/%d/%Y %H:%M'),
+        'Order Item Id': np.arange(100000, 100000 + n),
+        'Order Item Quantity': rng.integers(1, 6, n),
+        'Order State': rng.choice(sample['Order State'].unique(), n),
+        'shipping date (DateOrders)': (order_dates + pd.to_timedelta(real, unit='D')).strftime('%m/%d/%Y %H:%M'),
+        'Shipping Mode': rng.choice(sample['Shipping Mode'].unique(), n),
+        'User ID': rng.choice(sample['User ID'].unique(), n),
+        'Admin Recomended Slots/Previous Optimized Delivered Slots': rng.choice(
+            sample['Admin Recomended Slots/Previous Optimized Delivered Slots'].unique(), n),
+        'Parcel Delivered in This Slot': rng.choice(sample['Parcel Delivered in This Slot'].unique(), n),
+    })
+    return orders
+
+
+# -- measurement helpers -----------------------------------------------------
+
+def latency_summary(samples):
+    """Percentiles (ms) of a list of durations in seconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        'runs': int(ms.size),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    }
+
+
+def timed(fn, repeats):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def nearest_neighbour_km(lats, lngs):
+    """Length of the greedy nearest-neighbour tour from the depot; the quality reference."""
+    from distance import EARTH_RADIUS_KM
+    lat = np.radians(lats)
+    lng = np.radians(lngs)
+    cos_lat = np.cos(lat)
+    unvisited = np.ones(len(lat), dtype=bool)
+    unvisited[0] = False
+    current, total = 0, 0.0
+    for _ in range(len(lat) - 1):
+        a = (np.sin((lat - lat[current]) / 2) ** 2
+             + cos_lat * cos_lat[current] * np.sin((lng - lng[current]) / 2) ** 2)
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        km[~unvisited] = np.inf
+        current = int(np.argmin(km))
+        total += float(km[current])
+        unvisited[current] = False
+    a = (np.sin((lat[0] - lat[current]) / 2) ** 2
+         + cos_lat[0] * cos_lat[current] * np.sin((lng[0] - lng[current]) / 2) ** 2)
+    return total + 2 * EARTH_RADIUS_KM * float(np.arcsin(np.sqrt(min(a, 1.0))))
+
+
+def tour_km(lats, lngs, route):
+    """Haversine length of a tour given as location indices."""
+    from distance import EARTH_RADIUS_KM
+    lat = np.radians(lats[route])
+    lng = np.radians(lngs[route])
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * float(np.arcsin(np.sqrt(np.clip(a, 0, 1))).sum())
+
+
+def test_client():
+    # Solve in-process so route timings do not include worker start-up
+    os.environ.setdefault('SOLVER_WORKERS', '0')
+    import app
+    return app.app.test_client()
+
+
+# -- cases -------------------------------------------------------------------
+
+def bench_matrix(n, seed, repeats):
+    from distance import create_distance_matrix
+    lats, lngs = delivery_set(n, seed)
+    locations = [{'lat': a, 'lng': b} for a, b in zip(lats.tolist(), lngs.tolist())]
+    samples, _ = timed(lambda: create_distance_matrix(locations), repeats)
+    summary = latency_summary(samples)
+    summary['cells_per_s'] = round(n * n / float(np.median(samples)))
+    return summary
+
+
+def bench_solver(n, seed, time_limit_ms):
+    from clustering import chained_route, solve_clustered
+    from distance import haversine_matrix
+    from solver import solve_tsp
+    lats, lngs = delivery_set(n, seed)
+    started = time.perf_counter()
+    if n > MAX_DENSE_STOPS:
+        # Index 0 is the depot, as for solve_tsp; the tour revisits it between clusters
+        route, km, stats = solve_clustered((lats[0], lngs[0]), lats[1:], lngs[1:], time_limit_ms=time_limit_ms)
+    else:
+        route, km, stats = solve_tsp(haversine_matrix(lats, lngs), time_limit_ms=time_limit_ms)
+    elapsed = time.perf_counter() - started
+    reference_km = nearest_neighbour_km(lats, lngs)
+    result = {
+        'solve_ms': round(elapsed * 1000, 2),
+        'objective': stats['objective'],
+        'total_km': round(km, 3),
+        'reference_km': round(reference_km, 3),
+        'quality_ratio': round(km / reference_km, 4) if reference_km else None,
+        'metaheuristic': stats['metaheuristic'],
+        'clusters': stats.get('clusters'),
+    }
+    if n > MAX_DENSE_STOPS:
+        # What the depot returns cost against one tour through the same stop order
+        chained_km = tour_km(lats, lngs, chained_route(route))
+        result.update(depot_returns=route[1:-1].count(0), chained_km=round(chained_km, 3),
+                      chained_ratio=round(chained_km / reference_km, 4) if reference_km else None)
+    return result
+
+
+def bench_slot(model, seed, repeats):
+    client = test_client()
+    orders = order_batch(repeats, seed).astype(str).to_dict('records')
+    client.get('/api/slot', query_string={'model': model, **orders[0]})  # warm-up
+    samples = []
+    for order in orders:
+        started = time.perf_counter()
+        response = client.get('/api/slot', query_string={'model': model, **order})
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    summary = latency_summary(samples)
+    summary['requests_per_s'] = round(len(samples) / sum(samples), 1)
+    return summary
+
+
+def bench_slot_batch(n, seed, body):
+    client = test_client()
+    orders = order_batch(n, seed)
+    if body == 'csv':
+        payload = {'data': orders.to_csv(index=False), 'content_type': 'text/csv'}
+    else:
+        payload = {'data': orders.to_json(orient='records'), 'content_type': 'application/json'}
+    started = time.perf_counter()
+    response = client.post('/api/slot/batch', **payload)
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    response.close()
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {'rows': n, 'seconds': round(elapsed, 3), 'rows_per_s': round(n / elapsed, 1)}
+
+
+def bench_route(n, seed, time_limit_ms, repeats):
+    client = test_client()
+    lats, lngs = delivery_set(n + 1, seed)
+    body = {
+        'source_point': {'lat': lats[0], 'lng': lngs[0]},
+        'deliveries': [{'lat': a, 'lng': b} for a, b in zip(lats[1:].tolist(), lngs[1:].tolist())],
+        'time_limit_ms': time_limit_ms,
+        'cache': False,
+    }
+    samples, response = timed(lambda: client.post('/api/route', json=body), repeats)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    summary = latency_summary(samples)
+    summary['total_km'] = response.json['total_distance']
+    return summary
+
+
+CASES = {
+    'matrix': bench_matrix,
+    'solver': bench_solver,
+    'slot': bench_slot,
+    'slot_batch': bench_slot_batch,
+    'route': bench_route,
+}
+
+
+def _isolated(case, kwargs):
+    result = CASES[case](**kwargs)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_case(case, **kwargs):
+    """Run one case in a fresh process, so peak RSS belongs to that case alone."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_isolated, case, kwargs).result()
+
+
+def plan(args):
+    """(name, case, kwargs) for every benchmark this run should perform."""
+    sizes = QUICK_SIZES if args.quick else SIZES
+    solver_sizes = QUICK_SOLVER_SIZES if args.quick else SOLVER_SIZES
+    batch_sizes = BATCH_SIZES[:1] if args.quick else BATCH_SIZES
+    repeats = 3 if args.quick else args.repeats
+    cases = []
+    for n in sizes:
+        cases.append((f"matrix/n={n}", 'matrix', {'n': n, 'seed': args.seed, 'repeats': repeats}))
+    for n in solver_sizes:
+        cases.append((f"solver/n={n}", 'solver',
+                      {'n': n, 'seed': args.seed, 'time_limit_ms': args.time_limit_ms}))
+    for model in SLOT_MODELS:
+        cases.append((f"slot/model={model}", 'slot',
+                      {'model': model, 'seed': args.seed, 'repeats': 20 if args.quick else 200}))
+    for n in batch_sizes:
+        for body in ('json', 'csv'):
+            cases.append((f"slot_batch/{body}/n={n}", 'slot_batch', {'n': n, 'seed': args.seed, 'body': body}))
+    for n in ROUTE_SIZES[:2] if args.quick else ROUTE_SIZES:
+        cases.append((f"route/n={n}", 'route', {'n': n, 'seed': args.seed,
+                                                'time_limit_ms': args.time_limit_ms, 'repeats': repeats}))
+    return [case for case in cases if not args.only or case[1] in args.only]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, latency_tolerance, quality_tolerance):
+    """Print new vs. baseline for shared cases; returns the names that regressed."""
+    previous = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        checks = []
+        for key, tolerance in (('p50_ms', latency_tolerance), ('solve_ms', latency_tolerance),
+                               ('quality_ratio', quality_tolerance)):
+            if result.get(key) and old.get(key):
+                ratio = result[key] / old[key]
+                checks.append(f"{key} x{ratio:.3f}")
+                if ratio > tolerance:
+                    regressions.append(result['name'])
+        for key in ('rows_per_s', 'cells_per_s'):
+            if result.get(key) and old.get(key):
+                ratio = old[key] / result[key]
+                checks.append(f"{key} x{1 / ratio:.3f}")
+                if ratio > latency_tolerance:
+                    regressions.append(result['name'])
+        print(f"  {result['name']:<32} {'  '.join(checks)}")
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='small sizes and few repeats, for CI')
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='run only these cases')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--time-limit-ms', type=int, default=5000)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to check for regressions')
+    parser.add_argument('--latency-tolerance', type=float, default=DEFAULT_LATENCY_TOLERANCE)
+    parser.add_argument('--quality-tolerance', type=float, default=DEFAULT_QUALITY_TOLERANCE)
+    args = parser.parse_args()
+
+    results = []
+    for name, case, kwargs in plan(args):
+        result = {'name': name, 'case': case, **kwargs, **run_case(case, **kwargs)}
+        results.append(result)
+        print(json.dumps(result))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'quick': args.quick,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} ({baseline['meta'].get('commit')}):")
+        regressions = compare(results, baseline, args.latency_tolerance, args.quality_tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,490 @@
+"""Compact, memory-mapped inference format for the slot-prediction pipelines.
+
+`export()` converts the pickled sklearn pipelines in saved_models/ into
+saved_models/compact/<model>/: a meta.json with the preprocessing
+vocabulary plus plain .npy arrays (coefficients for logistic regression,
+flattened node arrays for the random forest and XGBoost). `load()` maps the
+arrays read-only with np.load(mmap_mode='r'), so every gunicorn worker shares
+the same page-cache pages instead of holding its own unpickled copy, and
+neither sklearn nor xgboost has to be imported to serve. `predict_one` is
+the single-order path used by /api/slot: no DataFrame, just a preallocated
+feature row (one dot product for logistic regression).
+
+Workers keep the arrays mapped while they serve, so an export never writes
+over them: each one goes to a fresh version directory next to meta.json, and
+replacing meta.json (which names that directory) is the atomic switch. The
+previous version is kept for readers that are between the two steps.
+
+Predictions are identical to the source pipeline (same float32/float64
+comparisons and accumulation order); `--verify` re-exports and checks both
+paths on a CSV, `--check` checks the export already on disk without writing:
+
+    python compact_models.py --verify Post.csv
+    python compact_models.py --check Post.csv
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models')
+COMPACT_DIR = os.path.join(MODELS_DIR, 'compact')
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+# Model name -> source pickle. KNN is left out: its "model" is the training
+# set itself, so there is nothing to compact.
+EXPORTABLE = {
+    'logistic_regression': 'logistic_regression_pipeline.pkl',
+    'random_forest': 'random_forest_pipeline.pkl',
+    'xgboost': 'xgboost_pipeline.pkl',
+}
+
+
+def _is_missing(value):
+    # Same rule as SimpleImputer on object columns: only NaN (value != value)
+    return value != value
+
+
+class CompactPreprocessor:
+    """The fitted ColumnTransformer (num/cat/ord) as lookups and arrays."""
+
+    def __init__(self, spec):
+        num = spec['num']
+        self.num_columns = num['columns']
+        self.num_fill = np.asarray(num['fill'], dtype=np.float64)
+        self.num_mean = np.asarray(num['mean'], dtype=np.float64)
+        self.num_scale = np.asarray(num['scale'], dtype=np.float64)
+        cat = spec['cat']
+        self.cat_columns = cat['columns']
+        self.cat_fill = cat['fill']
+        self.cat_offsets = []
+        self.cat_index = []
+        offset = len(self.num_columns)
+        for categories in cat['categories']:
+            self.cat_offsets.append(offset)
+            self.cat_index.append({value: i for i, value in enumerate(categories)})
+            offset += len(categories)
+        ordinal = spec['ord']
+        self.ord_columns = ordinal['columns']
+        self.ord_fill = ordinal['fill']
+        self.ord_offset = offset
+        self.ord_index = [{value: i for i, value in enumerate(c)} for c in ordinal['categories']]
+        self.n_features = offset + len(self.ord_columns)
+        # Plain floats for the single-row path; numpy scalars are slower one at a time
+        self._num_one = list(zip(self.num_columns, num['fill'], num['mean'], num['scale']))
+
+    def transform(self, data):
+        """Feature matrix for a preprocessed order DataFrame (float64, C order)."""
+        n = len(data)
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+
+        num = np.array(data[self.num_columns], dtype=np.float64)
+        missing = np.isnan(num)
+        if missing.any():
+            num[missing] = np.broadcast_to(self.num_fill, num.shape)[missing]
+        num -= self.num_mean
+        num /= self.num_scale
+        X[:, :len(self.num_columns)] = num
+
+        rows = np.arange(n)
+        for column, fill, offset, index in zip(self.cat_columns, self.cat_fill,
+                                               self.cat_offsets, self.cat_index):
+            # Unknown categories encode as all zeros (handle_unknown='ignore')
+            codes = [index.get(fill if _is_missing(v) else v, -1) for v in data[column].tolist()]
+            codes = np.fromiter(codes, dtype=np.intp, count=n)
+            known = codes >= 0
+            X[rows[known], offset + codes[known]] = 1.0
+
+        for j, (column, fill, index) in enumerate(zip(self.ord_columns, self.ord_fill,
+                                                      self.ord_index)):
+            values = [fill if _is_missing(v) else v for v in data[column].tolist()]
+            try:
+                X[:, self.ord_offset + j] = [index[v] for v in values]
+            except (KeyError, TypeError):
+                unknown = sorted({str(v) for v in values if v not in index})
+                raise ValueError(f"Found unknown categories {unknown} in column {j} during transform")
+        return X
+
+    def transform_one(self, features, out):
+        """Fill the 1-D vector `out` from one order's model inputs (column -> value).
+
+        Absent columns count as missing, as they do after preprocess_new_order.
+        """
+        out.fill(0.0)
+        for j, (column, fill, mean, scale) in enumerate(self._num_one):
+            value = features.get(column, math.nan)
+            if value != value:
+                value = fill
+            out[j] = (value - mean) / scale
+        for column, fill, offset, index in zip(self.cat_columns, self.cat_fill,
+                                               self.cat_offsets, self.cat_index):
+            value = features.get(column, math.nan)
+            code = index.get(fill if _is_missing(value) else value, -1)
+            if code >= 0:
+                out[offset + code] = 1.0
+        for j, (column, fill, index) in enumerate(zip(self.ord_columns, self.ord_fill,
+                                                      self.ord_index)):
+            value = features.get(column, math.nan)
+            value = fill if _is_missing(value) else value
+            try:
+                out[self.ord_offset + j] = index[value]
+            except (KeyError, TypeError):
+                raise ValueError(f"Found unknown categories [{value!s}] in column {j} during transform")
+        return out
+
+
+class CompactModel:
+    """Predicts encoded slot classes like the source pipeline's predict()."""
+
+    def __init__(self, meta, arrays):
+        self.kind = meta['kind']
+        self.preprocessor = CompactPreprocessor(meta['preprocessor'])
+        self.classes_ = np.asarray(meta['classes'])
+        self.arrays = arrays
+        self.n_trees = meta.get('n_trees')
+        self.depth = meta.get('depth')
+        self.source_sha256 = meta.get('source_sha256')
+        self._local = threading.local()
+
+    def predict(self, data):
+        return self._predict_matrix(self.preprocessor.transform(data))
+
+    def predict_one(self, features):
+        """Encoded class for a single order given as {column: value}, without pandas.
+
+        The feature row is a preallocated per-thread (1, n_features) buffer, so
+        the logistic regression is one small dot product.
+        """
+        x = getattr(self._local, 'row', None)
+        if x is None:
+            x = self._local.row = np.empty((1, self.preprocessor.n_features), dtype=np.float64)
+        self.preprocessor.transform_one(features, x[0])
+        if self.kind == 'linear':
+            scores = x @ self.arrays['coef'].T + self.arrays['intercept']
+            return self.classes_[scores[0].argmax()]
+        return self._predict_matrix(x)[0]
+
+    def _predict_matrix(self, X):
+        if self.kind == 'linear':
+            scores = X @ self.arrays['coef'].T + self.arrays['intercept']
+        elif self.kind == 'forest':
+            scores = self._forest_proba(X)
+        else:
+            scores = self._boosted_margin(X)
+        return self.classes_[np.argmax(scores, axis=1)]
+
+    def _leaves(self, X, strict):
+        """Leaf node reached in every tree, shape (n_samples, n_trees)."""
+        a = self.arrays
+        node = np.broadcast_to(a['roots'], (len(X), len(a['roots']))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.depth):
+            left = a['left'][node]
+            value = X[rows, a['feature'][node]]
+            threshold = a['threshold'][node]
+            go_left = value < threshold if strict else value <= threshold
+            if strict:
+                go_left |= np.isnan(value) & a['default_left'][node]
+            node = np.where(left < 0, node, np.where(go_left, left, a['right'][node]))
+        return node
+
+    def _forest_proba(self, X):
+        # sklearn trees compare float32 features against float64 thresholds
+        leaves = self._leaves(X.astype(np.float32), strict=False)
+        # Sum tree by tree (reduction over axis 0 is sequential), as sklearn does
+        proba = np.add.reduce(self.arrays['value'][leaves.T], axis=0)
+        return proba / self.n_trees
+
+    def _boosted_margin(self, X):
+        a = self.arrays
+        leaves = self._leaves(X.astype(np.float32), strict=True)
+        n_classes = len(self.classes_)
+        margin = np.empty((len(X), n_classes), dtype=np.float32)
+        for k in range(n_classes):
+            trees = np.flatnonzero(a['tree_class'] == k)
+            # float32 running sum from the base score in tree order, as xgboost does
+            stacked = np.vstack([np.full((1, len(X)), a['base_score'][k], dtype=np.float32),
+                                 a['value'][leaves[:, trees].T]])
+            margin[:, k] = np.add.reduce(stacked, axis=0)
+        return margin
+
+
+def _preprocessor_spec(column_transformer):
+    transformers = {name: (pipe, columns) for name, pipe, columns in column_transformer.transformers_}
+    num, num_columns = transformers['num']
+    cat, cat_columns = transformers['cat']
+    ordinal, ord_columns = transformers['ord']
+    return {
+        'num': {
+            'columns': list(num_columns),
+            'fill': num.named_steps['imputer'].statistics_.tolist(),
+            'mean': num.named_steps['scaler'].mean_.tolist(),
+            'scale': num.named_steps['scaler'].scale_.tolist(),
+        },
+        'cat': {
+            'columns': list(cat_columns),
+            'fill': [v.item() if hasattr(v, 'item') else v for v in cat.named_steps['imputer'].statistics_],
+            'categories': [c.tolist() for c in cat.named_steps['onehot'].categories_],
+        },
+        'ord': {
+            'columns': list(ord_columns),
+            'fill': [v.item() if hasattr(v, 'item') else v for v in ordinal.named_steps['imputer'].statistics_],
+            'categories': [c.tolist() for c in ordinal.named_steps['ordinal'].categories_],
+        },
+    }
+
+
+def _flatten(trees):
+    """Concatenate per-tree node arrays, turning child ids into global indices (-1 = leaf)."""
+    roots, left, right = [], [], []
+    offset = 0
+    for tree_left, tree_right in trees:
+        roots.append(offset)
+        leaf = tree_left < 0
+        left.append(np.where(leaf, -1, tree_left + offset))
+        right.append(np.where(leaf, -1, tree_right + offset))
+        offset += len(tree_left)
+    return (np.asarray(roots, dtype=np.int32), np.concatenate(left).astype(np.int32),
+            np.concatenate(right).astype(np.int32))
+
+
+def _export_linear(classifier):
+    return {'kind': 'linear'}, {
+        'coef': np.ascontiguousarray(classifier.coef_, dtype=np.float64),
+        'intercept': np.ascontiguousarray(classifier.intercept_, dtype=np.float64),
+    }
+
+
+def _export_forest(classifier):
+    trees = [estimator.tree_ for estimator in classifier.estimators_]
+    roots, left, right = _flatten([(t.children_left, t.children_right) for t in trees])
+    value = []
+    for t in trees:
+        # Leaf class fractions, normalized the way DecisionTreeClassifier.predict_proba does
+        proba = t.value[:, 0, :]
+        normalizer = proba.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(proba / normalizer)
+    meta = {'kind': 'forest', 'n_trees': len(trees), 'depth': int(max(t.max_depth for t in trees))}
+    return meta, {
+        'roots': roots, 'left': left, 'right': right,
+        'feature': np.concatenate([np.maximum(t.feature, 0) for t in trees]).astype(np.int32),
+        'threshold': np.concatenate([t.threshold for t in trees]).astype(np.float64),
+        'value': np.concatenate(value).astype(np.float64),
+    }
+
+
+def _tree_depth(left, right):
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for node in frontier for c in (left[node], right[node]) if c >= 0]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def _export_boosted(classifier):
+    model = json.loads(classifier.get_booster().save_raw('json'))
+    learner = model['learner']
+    if not learner['objective']['name'].startswith('multi:'):
+        raise ValueError(f"Unsupported XGBoost objective {learner['objective']['name']}")
+    booster = learner['gradient_booster']['model']
+    trees = booster['trees']
+    tree_left = [np.asarray(t['left_children']) for t in trees]
+    tree_right = [np.asarray(t['right_children']) for t in trees]
+    roots, left, right = _flatten(zip(tree_left, tree_right))
+    base_score = json.loads(learner['learner_model_param']['base_score'])
+    if not isinstance(base_score, list):
+        base_score = [base_score] * len(classifier.classes_)
+    depth = max(_tree_depth(l, r) for l, r in zip(tree_left, tree_right))
+    return {'kind': 'boosted', 'depth': depth}, {
+        'roots': roots, 'left': left, 'right': right,
+        'feature': np.concatenate([t['split_indices'] for t in trees]).astype(np.int32),
+        # Leaves keep their output in split_conditions
+        'threshold': np.concatenate([t['split_conditions'] for t in trees]).astype(np.float32),
+        'value': np.concatenate([t['split_conditions'] for t in trees]).astype(np.float32),
+        'default_left': np.concatenate([t['default_left'] for t in trees]).astype(bool),
+        'tree_class': np.asarray(booster['tree_info'], dtype=np.int32),
+        'base_score': np.asarray(base_score, dtype=np.float32),
+    }
+
+
+def export_pipeline(pipeline, out_dir, source_digest=None):
+    """Write `pipeline` (preprocessor + classifier) in the compact format to `out_dir`.
+
+    `source_digest` (the pickle's sha256) lets ModelRegistry tell when the
+    pickle has been replaced since this export.
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    classifier = pipeline.steps[-1][1]
+    kind = type(classifier).__name__
+    if kind in ('LogisticRegression', 'SGDClassifier'):
+        meta, arrays = _export_linear(classifier)
+    elif kind == 'RandomForestClassifier':
+        meta, arrays = _export_forest(classifier)
+    elif kind == 'XGBClassifier':
+        meta, arrays = _export_boosted(classifier)
+    else:
+        raise ValueError(f"No compact format for {kind}")
+
+    meta.update(
+        version=FORMAT_VERSION,
+        source=kind,
+        classes=np.asarray(classifier.classes_).tolist(),
+        preprocessor=_preprocessor_spec(preprocessor),
+        source_sha256=source_digest,
+    )
+    save_arrays(out_dir, arrays, meta)
+
+
+def save_arrays(out_dir, arrays, meta):
+    """Write `arrays` to a new version directory in `out_dir`, then point `out_dir`/meta.json at it."""
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _data_dir(out_dir)
+    data_dir = tempfile.mkdtemp(prefix=time.strftime('v%Y%m%dT%H%M%S-'), dir=out_dir)
+    os.chmod(data_dir, 0o755)
+    for name, array in arrays.items():
+        np.save(os.path.join(data_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    meta = dict(meta, arrays=sorted(arrays), data=os.path.basename(data_dir))
+    # meta.json goes last: its mtime is what ModelRegistry watches for reloads
+    tmp = os.path.join(out_dir, META_FILE + '.tmp')
+    with open(tmp, 'w') as file:
+        json.dump(meta, file, indent=1)
+    os.replace(tmp, os.path.join(out_dir, META_FILE))
+    _prune(out_dir, keep={meta['data'], previous})
+
+
+def load_arrays(model_dir, meta):
+    """The arrays listed in `meta`, memory-mapped read-only from the version it names."""
+    # Exports from before version directories keep their arrays next to meta.json
+    data_dir = os.path.join(model_dir, meta.get('data', ''))
+    # asarray drops the np.memmap subclass (and its per-operation overhead) but keeps the mapping
+    return {name: np.asarray(np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r'))
+            for name in meta['arrays']}
+
+
+def _data_dir(out_dir):
+    try:
+        with open(os.path.join(out_dir, META_FILE)) as file:
+            return json.load(file).get('data', '')
+    except (OSError, ValueError):
+        return None
+
+
+def _prune(out_dir, keep):
+    # Unlinking is safe for workers still mapping an old version: the mapping outlives the name
+    for entry in os.scandir(out_dir):
+        if entry.is_dir() and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith('.npy') and '' not in keep:
+            os.remove(entry.path)
+
+
+def load(path):
+    """Load a compact model from its directory (or its meta.json), memory-mapping the arrays."""
+    model_dir = os.path.dirname(path) if path.endswith(META_FILE) else path
+    with open(os.path.join(model_dir, META_FILE)) as file:
+        meta = json.load(file)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model version {meta.get('version')} in {model_dir}")
+    return CompactModel(meta, load_arrays(model_dir, meta))
+
+
+def file_digest(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def compact_path(name, compact_dir=COMPACT_DIR):
+    return os.path.join(compact_dir, name, META_FILE)
+
+
+def export(models_dir=MODELS_DIR, compact_dir=COMPACT_DIR, names=None):
+    """Export every exportable pipeline; returns the names written."""
+    written = []
+    for name in names or EXPORTABLE:
+        source = os.path.join(models_dir, EXPORTABLE[name])
+        with open(source, 'rb') as file:
+            pipeline = pickle.load(file)
+        export_pipeline(pipeline, os.path.join(compact_dir, name), source_digest=file_digest(source))
+        logger.info(f"Exported {name} to {os.path.join(compact_dir, name)}")
+        written.append(name)
+    return written
+
+
+def verify(csv_path, models_dir=MODELS_DIR, compact_dir=COMPACT_DIR, names=None):
+    """Compare compact and pickled predictions on every row of a CSV; returns {name: mismatches}.
+
+    Checks the batch path and the single-row predict_one path, the latter
+    with each row both as typed values and as query-string text.
+    """
+    import pandas as pd
+
+    from app import order_features, preprocess_new_order
+
+    raw = pd.read_csv(csv_path)
+    typed = raw.astype(object).where(raw.notna(), None).to_dict('records')
+    text = [{k: str(v) for k, v in row.items() if v is not None} for row in typed]
+    data = preprocess_new_order(raw)
+    text_data = preprocess_new_order(pd.DataFrame(text))
+    mismatches = {}
+    for name in names or EXPORTABLE:
+        with open(os.path.join(models_dir, EXPORTABLE[name]), 'rb') as file:
+            pipeline = pickle.load(file)
+        model = load(os.path.join(compact_dir, name))
+        count = int(np.sum(pipeline.predict(data) != model.predict(data)))
+        for rows, frame in ((typed, data), (text, text_data)):
+            expected = pipeline.predict(frame)
+            count += sum(model.predict_one(order_features(row)) != e for row, e in zip(rows, expected))
+        mismatches[name] = int(count)
+    return mismatches
+
+
+def single_row_latency(name, order, compact_dir=COMPACT_DIR, repeat=2000):
+    """Mean predict_one time in microseconds for one raw order dict."""
+    from app import order_features
+
+    model = load(os.path.join(compact_dir, name))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        model.predict_one(order_features(order))
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export saved_models/ pipelines to the compact format.')
+    parser.add_argument('--models', nargs='+', choices=sorted(EXPORTABLE))
+    parser.add_argument('--verify', metavar='CSV',
+                        help='after exporting, check predictions match the pickles on this CSV')
+    parser.add_argument('--check', metavar='CSV',
+                        help='check the existing export against the pickles on this CSV, without exporting')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.check:
+        export(names=args.models)
+    csv_path = args.check or args.verify
+    if csv_path:
+        mismatches = verify(csv_path, names=args.models)
+        from app import get_default_order
+        for name, count in mismatches.items():
+            latency = single_row_latency(name, get_default_order())
+            print(f"{name}: {count} mismatched predictions, single row {latency:.1f} us")
+        if any(mismatches.values()):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Upper bound on cells per row block, so temporaries stay around 32 MB of float64
+# no matter how many stops the matrix has.
+BLOCK_CELLS = 1 << 22
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate the great circle distance between two points on earth."""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(lats, lngs, dtype=np.float64, block_rows=None):
+    """Build the symmetric N×N great-circle distance matrix (km) from coordinate arrays.
+
+    Rows are processed in blocks and only the upper triangle of each block is
+    computed; it is mirrored into the lower triangle. Trig is always evaluated
+    in float64, `dtype` only controls the stored result (float32 halves memory).
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    n = lat.size
+    out = np.empty((n, n), dtype=dtype)
+    if n == 0:
+        return out
+
+    cos_lat = np.cos(lat)
+    if block_rows is None:
+        block_rows = max(1, BLOCK_CELLS // n)
+
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        rows = slice(start, stop)
+        cols = slice(start, n)
+
+        # a = sin²(Δlat/2) + cos(lat1)·cos(lat2)·sin²(Δlng/2), built in place
+        a = np.subtract.outer(lat[rows], lat[cols])
+        a *= 0.5
+        np.sin(a, out=a)
+        np.square(a, out=a)
+        h = np.subtract.outer(lng[rows], lng[cols])
+        h *= 0.5
+        np.sin(h, out=h)
+        np.square(h, out=h)
+        h *= cos_lat[rows, None]
+        h *= cos_lat[None, cols]
+        a += h
+        del h
+        np.clip(a, 0.0, 1.0, out=a)
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        a *= 2 * EARTH_RADIUS_KM
+
+        out[rows, cols] = a
+        out[cols, rows] = a.T
+
+    np.fill_diagonal(out, 0)
+    return out
+
+
+class HaversineCosts:
+    """The default cost provider: great-circle km, and no travel times of its own."""
+
+    path = None
+    key = 'haversine'
+
+    def matrix(self, lats, lngs):
+        return haversine_matrix(lats, lngs)
+
+    def travel_minutes(self, lats, lngs):
+        # Callers convert km with their own speed assumption
+        return None
+
+
+def location_coordinates(locations):
+    """Pull (lats, lngs) arrays from location dicts using lat/lng or latitude/longitude keys."""
+    lats = np.fromiter(
+        (loc.get('lat', loc.get('latitude', 0)) for loc in locations),
+        dtype=np.float64, count=len(locations))
+    lngs = np.fromiter(
+        (loc.get('lng', loc.get('longitude', 0)) for loc in locations),
+        dtype=np.float64, count=len(locations))
+    return lats, lngs
+
+
+def create_distance_matrix(locations, dtype=np.float64):
+    """Create a matrix of distances between all locations."""
+    lats, lngs = location_coordinates(locations)
+    return haversine_matrix(lats, lngs, dtype=dtype)
+
+
+def haversine_cross(lats1, lngs1, lats2, lngs2, dtype=np.float64):
+    """Great-circle distances (km) from every point in set 1 to every point in set 2."""
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lngs1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lngs2, dtype=np.float64))
+    a = (np.sin(np.subtract.outer(lat1, lat2) / 2) ** 2
+         + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(np.subtract.outer(lng1, lng2) / 2) ** 2)
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))).astype(dtype, copy=False)
+
+
+def update_distance_matrix(matrix, keep, lats, lngs):
+    """Patch an existing distance matrix after locations were removed and added.
+
+    `keep` lists the rows of `matrix` that survive, in their new order; they take
+    the first len(keep) positions of (lats, lngs) and the rest are new locations.
+    Only the rows and columns of the new locations are computed.
+    """
+    keep = np.asarray(keep, dtype=np.int64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    n_keep, n = keep.size, lats.size
+    out = np.empty((n, n), dtype=matrix.dtype)
+    out[:n_keep, :n_keep] = matrix[np.ix_(keep, keep)]
+    if n > n_keep:
+        new_rows = haversine_cross(lats[n_keep:], lngs[n_keep:], lats, lngs, dtype=matrix.dtype)
+        out[n_keep:, :] = new_rows
+        out[:, n_keep:] = new_rows.T
+        np.fill_diagonal(out, 0)
+    return out
@@ -0,0 +1,21 @@
+"""gunicorn settings, read automatically from the working directory.
+
+The app is imported once in the master (preload_app) in lazy startup mode,
+and its models are loaded and warmed there before any worker forks, so every
+worker starts ready and shares the model memory copy-on-write. The routing
+stack is left to the workers: OR-Tools is imported by the first route request
+a worker serves, never in the master. Command-line flags (the Procfile's
+--workers / --threads / --timeout) override the settings here.
+"""
+import os
+
+os.environ.setdefault('STARTUP_MODE', 'lazy')
+
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the preload and before the first worker is forked
+    import app
+
+    app.warm_up()
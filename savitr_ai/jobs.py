@@ -0,0 +1,196 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+# Finished jobs kept for polling before the oldest are forgotten
+DEFAULT_MAX_FINISHED_JOBS = 256
+# Workers report the best tour at most this often
+PROGRESS_INTERVAL_S = 0.2
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+# Set in each pool process by _init_worker
+_broker = None
+
+
+def _init_worker(broker):
+    global _broker
+    _broker = broker
+
+
+class _ProgressReporter:
+    """on_improvement hook run inside a worker: sends throttled progress to the broker.
+
+    An improvement inside the throttle window is held back; a later one
+    replaces it, and `flush` sends the last one with the finished tour.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started = time.monotonic()
+        self.sent_at = None
+        self.pending = None
+
+    def __call__(self, objective, snapshot):
+        now = time.monotonic()
+        if self.sent_at is not None and now - self.sent_at < PROGRESS_INTERVAL_S:
+            # snapshot() is only valid during this call; the final tour stands in for it
+            self.pending = (objective, now)
+            return
+        self.pending = None
+        self.sent_at = now
+        self.send(objective, snapshot(), now)
+
+    def send(self, objective, route, now):
+        _broker.put((self.job_id, 'progress', {
+            'objective': int(objective),
+            'route': route,
+            'elapsed_ms': round((now - self.started) * 1000, 2),
+        }))
+
+    def flush(self, route):
+        """Send the held-back improvement; the solve returned its tour as `route`."""
+        if self.pending is not None and route:
+            objective, found_at = self.pending
+            self.send(objective, route, found_at)
+        self.pending = None
+
+
+def _run_job(job_id, fn, args, kwargs):
+    _broker.put((job_id, RUNNING, None))
+    reporter = _ProgressReporter(job_id)
+    result = fn(*args, on_improvement=reporter, **kwargs)
+    reporter.flush(result[0])
+    # The result follows the progress on the same queue, so the job only
+    # turns done once its last improvement has been recorded
+    _broker.put((job_id, DONE, result))
+
+
+class JobQueue:
+    """Runs solves in a bounded process pool and tracks their progress in memory.
+
+    Pool processes push progress through a multiprocessing queue that a
+    listener thread drains into the job table, so no external broker is
+    needed. `fn` must be importable by the workers, accept an
+    `on_improvement(objective, snapshot)` keyword and return (route, ...) as
+    solve_tsp does. Jobs live in this process only: with several gunicorn
+    workers, poll the worker that accepted the job.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, max_finished=DEFAULT_MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._changed = threading.Condition()
+        self._pool = None
+        self._broker = None
+
+    def _start(self):
+        # spawn, not fork: the web worker has threads and OR-Tools state
+        context = multiprocessing.get_context('spawn')
+        if self._broker is None:
+            self._broker = context.SimpleQueue()
+            threading.Thread(target=self._listen, name='job-broker', daemon=True).start()
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(self._broker,))
+
+    def submit(self, fn, *args, context=None, **kwargs):
+        """Queue fn(*args, **kwargs) and return the new job id right away."""
+        job_id = uuid.uuid4().hex
+        with self._changed:
+            if self._pool is None:
+                self._start()
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': QUEUED,
+                'submitted_at': time.time(),
+                'context': context,
+                'best': None,
+                'progress': [],
+                'result': None,
+                'error': None,
+            }
+            future = self._pool.submit(_run_job, job_id, fn, args, kwargs)
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def get(self, job_id):
+        """Shallow copy of a job record, or None if it is unknown or expired."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job, progress=list(job['progress'])) if job else None
+
+    def wait(self, job_id, seen, timeout):
+        """Block until the job has more than `seen` progress events or finishes."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs
+                or len(self._jobs[job_id]['progress']) > seen
+                or self._jobs[job_id]['status'] in FINISHED,
+                timeout=timeout)
+        return self.get(job_id)
+
+    def _listen(self):
+        while True:
+            job_id, kind, payload = self._broker.get()
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == RUNNING and job['status'] == QUEUED:
+                    job['status'] = RUNNING
+                    job['started_at'] = time.time()
+                elif kind == 'progress' and job['status'] == RUNNING:
+                    job['best'] = payload
+                    job['progress'].append({k: v for k, v in payload.items() if k != 'route'})
+                elif kind == DONE and job['status'] not in FINISHED:
+                    self._settle(job, DONE, result=payload)
+                self._changed.notify_all()
+
+    def _finish(self, job_id, future):
+        # Results arrive through the broker; only failures are recorded here
+        try:
+            future.result()
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            error = str(e)
+        with self._changed:
+            if isinstance(future.exception(), BrokenProcessPool):
+                # A worker died (e.g. OOM); start a fresh pool for the next job
+                self._pool = None
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return
+            self._settle(job, FAILED, error=error)
+            self._changed.notify_all()
+
+    def _settle(self, job, status, result=None, error=None):
+        job['status'] = status
+        job['result'] = result
+        job['error'] = error
+        job['finished_at'] = time.time()
+        self._evict()
+
+    def _evict(self):
+        finished = [k for k, job in self._jobs.items() if job['status'] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+def job_queue_from_env():
+    """JobQueue sized by JOB_WORKERS / JOB_HISTORY."""
+    return JobQueue(
+        max_workers=int(os.environ.get('JOB_WORKERS', DEFAULT_JOB_WORKERS)),
+        max_finished=int(os.environ.get('JOB_HISTORY', DEFAULT_MAX_FINISHED_JOBS)),
+    )
@@ -0,0 +1,145 @@
+import bisect
+import io
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# Upper bounds (seconds) shared by every histogram: 1 ms .. 2 min
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 120.0)
+PROFILERS = ('cprofile', 'pyinstrument')
+# Lines of the cProfile report returned for a profiled request
+PROFILE_LINES = 60
+
+
+class Histogram:
+    """Minimal Prometheus histogram keyed by label values; safe across request threads."""
+
+    def __init__(self, name, documentation, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self, out):
+        out.write(f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} histogram\n")
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            prefix = pairs + ',' if pairs else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                out.write(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}\n')
+            out.write(f'{self.name}_sum{{{pairs}}} {total}\n{self.name}_count{{{pairs}}} {cumulative}\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'savitr_request_duration_seconds', 'Wall-clock time per request.',
+    ('route', 'method', 'status', 'model'))
+STAGE_SECONDS = Histogram(
+    'savitr_stage_duration_seconds',
+    'Time per request stage (parse, preprocess, predict, matrix, setup, solve, serialize).',
+    ('route', 'stage', 'model'))
+
+ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage of the current request."""
+    if not ENABLED or not has_request_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def record(name, seconds):
+    """Add an externally measured stage (e.g. solve time reported by a worker)."""
+    if ENABLED and has_request_context():
+        g.setdefault('stages', []).append((name, seconds))
+
+
+def set_model(name):
+    """Label the current request's metrics with the model that served it."""
+    if has_request_context():
+        g.metrics_model = name
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+
+
+def finish_request(route, method, status):
+    """Observe the current request and its stages."""
+    if not ENABLED or 'request_started' not in g:
+        return
+    observe_request(route, method, status, g.get('metrics_model', ''), g.request_started,
+                    g.get('stages', ()))
+
+
+def observe_request(route, method, status, model, started, stages):
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route, method, str(status), model)
+    for name, seconds in stages:
+        STAGE_SECONDS.observe(seconds, route, name, model)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    out = io.StringIO()
+    REQUEST_SECONDS.render(out)
+    STAGE_SECONDS.render(out)
+    return out.getvalue()
+
+
+def start_profiler(kind):
+    """Start a cProfile or pyinstrument profiler; returns None if the kind is unavailable."""
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return None
+        profiler = Profiler()
+        profiler.start()
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def profile_report(kind, profiler):
+    """Stop the profiler and return its report as text."""
+    if kind == 'pyinstrument':
+        profiler.stop()
+        return profiler.output_text(unicode=True)
+    import pstats
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return out.getvalue()
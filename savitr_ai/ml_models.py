@@ -1,30 +1,20 @@
-import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.preprocessing import StandardScaler, OrdinalEncoder, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_curve, auc, precision_recall_curve, average_precision_score
 from sklearn.linear_model import LogisticRegression
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.ensemble import RandomForestClassifier
 import xgboost as xgb
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.impute import SimpleImputer
 
-df = pd.read_csv("Post.csv")
-
 time_slots = [
     '10:00 AM - 12:00 PM',
     '12:00 PM - 03:00 PM',
     '03:00 PM - 05:00 PM'
 ]
 
-df['shipping_delay'] = df['Days for shipping (real)'] - df['Days for shipment (scheduled)']
-
-user_id_mapping = df.groupby('User ID')['Machine Prediction'].apply(lambda x: x.mode()[0] if not x.mode().empty else None)
-df['user_id_encoded'] = df['User ID'].map(user_id_mapping)
+TARGET = 'Machine Prediction'
 
 numeric_features = [
     'Days for shipping (real)',
@@ -45,53 +35,109 @@ ordinal_features = [
     'Parcel Delivered in This Slot'
 ]
 
-numeric_transformer = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='median')),
-    ('scaler', StandardScaler())
-])
-
-categorical_transformer = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='most_frequent')),
-    ('onehot', OneHotEncoder(handle_unknown='ignore'))
-])
-
-ordinal_transformer = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='most_frequent')),
-    ('ordinal', OrdinalEncoder(categories=[time_slots] * len(ordinal_features)))
-])
-
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numeric_transformer, numeric_features),
-        ('cat', categorical_transformer, categorical_features),
-        ('ord', ordinal_transformer, ordinal_features)
-    ],
-    remainder='drop'
-)
-
-y = df['Machine Prediction']
-y_encoder = OrdinalEncoder(categories=[time_slots])
-y_encoded = y_encoder.fit_transform(y.values.reshape(-1, 1)).ravel()
-
-models = {
-    'Logistic Regression': LogisticRegression(
-            class_weight='balanced',
-            max_iter=1000,
-            random_state=42
-        ),
-    'K-Nearest Neighbors': KNeighborsClassifier(n_neighbors=3),
-    'Random Forest': RandomForestClassifier(n_estimators=100, max_features="log2", random_state=42),
-    'XGBoost': xgb.XGBClassifier(
-            objective='multi:softprob',
-            learning_rate=0.1,
-            max_depth=1,
-            n_estimators=100,
-            random_state=42,
-            eval_metric='mlogloss'
-        )
-}
-
-pipelines = {name: Pipeline(steps=[
-    ('preprocessor', preprocessor),
-    ('classifier', model)
-]) for name, model in models.items()}
\ No newline at end of file
+# Raw history columns the features are derived from
+INPUT_COLUMNS = [
+    'Days for shipping (real)',
+    'Days for shipment (scheduled)',
+    'Order Item Quantity',
+    'Delivery Status',
+    'Customer Segment',
+    'Shipping Mode',
+    'User ID',
+    'order date (DateOrders)',
+    *ordinal_features,
+    TARGET
+]
+
+
+def user_slot_modes(counts):
+    """User ID -> most frequent slot, from a Series of counts indexed by (User ID, slot).
+
+    Same result as a per-user x.mode()[0] (ties go to the first slot in sort
+    order) without a Python call per user on large histories.
+    """
+    counts = counts.rename('count').reset_index()
+    modes = counts.sort_values(['User ID', 'count', TARGET], ascending=[True, False, True])
+    return modes.drop_duplicates('User ID').set_index('User ID')[TARGET]
+
+
+def add_features(df, user_id_mapping=None):
+    """Derive shipping_delay and user_id_encoded (each user's most frequent slot) in place.
+
+    The mapping is computed from `df` itself unless one is passed in, e.g. one
+    accumulated over a whole history read in chunks.
+    """
+    df['shipping_delay'] = df['Days for shipping (real)'] - df['Days for shipment (scheduled)']
+    if user_id_mapping is None:
+        user_id_mapping = user_slot_modes(df.groupby(['User ID', TARGET]).size())
+    df['user_id_encoded'] = df['User ID'].map(user_id_mapping)
+    return df
+
+
+def load_history(path):
+    """Read an order-history CSV (Post.csv layout) with just the columns training needs."""
+    return add_features(pd.read_csv(path, usecols=INPUT_COLUMNS))
+
+
+def build_preprocessor(categories='auto'):
+    """The shared ColumnTransformer; `categories` fixes the one-hot vocabularies up front."""
+    numeric_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+
+    categorical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore', categories=categories))
+    ])
+
+    ordinal_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('ordinal', OrdinalEncoder(categories=[time_slots] * len(ordinal_features)))
+    ])
+
+    return ColumnTransformer(
+        transformers=[
+            ('num', numeric_transformer, numeric_features),
+            ('cat', categorical_transformer, categorical_features),
+            ('ord', ordinal_transformer, ordinal_features)
+        ],
+        remainder='drop'
+    )
+
+
+def build_target_encoder():
+    return OrdinalEncoder(categories=[time_slots])
+
+
+def build_models():
+    return {
+        'Logistic Regression': LogisticRegression(
+                class_weight='balanced',
+                max_iter=1000,
+                random_state=42
+            ),
+        'K-Nearest Neighbors': KNeighborsClassifier(n_neighbors=3),
+        'Random Forest': RandomForestClassifier(n_estimators=100, max_features="log2", random_state=42),
+        'XGBoost': xgb.XGBClassifier(
+                objective='multi:softprob',
+                learning_rate=0.1,
+                max_depth=1,
+                n_estimators=100,
+                random_state=42,
+                eval_metric='mlogloss'
+            )
+    }
+
+
+def build_pipelines(preprocessor=None):
+    preprocessor = preprocessor or build_preprocessor()
+    return {name: Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', model)
+    ]) for name, model in build_models().items()}
+
+
+def pipeline_filename(name):
+    """'Random Forest' -> 'random_forest_pipeline.pkl', the names model_registry expects."""
+    return f"{name.lower().replace(' ', '_')}_pipeline.pkl"
@@ -0,0 +1,160 @@
+import logging
+import os
+import pickle
+import threading
+
+import compact_models
+import user_features
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models')
+
+# Query-parameter name -> pickle in saved_models/
+MODEL_FILES = {
+    'logistic_regression': 'logistic_regression_pipeline.pkl',
+    'knn': 'k-nearest_neighbors_pipeline.pkl',
+    'random_forest': 'random_forest_pipeline.pkl',
+    'xgboost': 'xgboost_pipeline.pkl',
+}
+DEFAULT_MODEL = 'logistic_regression'
+ENCODERS_FILE = 'encoders.pkl'
+# 'compact' serves saved_models/compact/<name>/ when it has been exported
+# (see compact_models.py) and falls back to the pickle; 'pickle' always unpickles
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'compact').lower()
+
+
+class UnknownModelError(KeyError):
+    """Raised when a caller asks for a model the registry does not know."""
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+class _Entry:
+    __slots__ = ('path', 'loader', 'source', 'obj', 'mtime', 'lock')
+
+    def __init__(self, path, loader=_load_pickle, source=None):
+        self.path = path
+        self.loader = loader
+        # Pickle a compact export was made from, watched alongside it
+        self.source = source
+        self.obj = None
+        self.mtime = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Loads each model once per process and reloads it when the file changes.
+
+    Models exported to the compact format are memory-mapped from
+    saved_models/compact/ instead of unpickled, unless `model_format` is 'pickle'.
+    Their pickles are watched too: a pickle replaced since the export is served
+    unpickled until compact_models.py exports it again.
+
+    Reloads build the new object before swapping it in, so requests that already
+    hold a reference to the previous pipeline finish with it undisturbed.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, model_files=None, encoders_file=ENCODERS_FILE,
+                 model_format=MODEL_FORMAT):
+        self.models_dir = models_dir
+        self.model_files = dict(model_files or MODEL_FILES)
+        self._entries = {
+            name: self._entry(name, filename, model_format)
+            for name, filename in self.model_files.items()
+        }
+        self._encoders = _Entry(os.path.join(models_dir, encoders_file))
+        self._user_features = _Entry(
+            os.path.join(models_dir, 'user_features', user_features.META_FILE), user_features.load)
+
+    def _entry(self, name, filename, model_format):
+        compact = compact_models.compact_path(name, os.path.join(self.models_dir, 'compact'))
+        path = os.path.join(self.models_dir, filename)
+        if model_format == 'compact' and os.path.exists(compact):
+            return _Entry(compact, compact_models.load, source=path)
+        return _Entry(path)
+
+    def available(self):
+        return sorted(self._entries)
+
+    def get(self, name=None):
+        """Return the pipeline registered under `name`, loading or reloading it if needed."""
+        name = name or DEFAULT_MODEL
+        entry = self._entries.get(name)
+        if entry is None:
+            raise UnknownModelError(name)
+        return self._fresh(entry)
+
+    def encoders(self):
+        return self._fresh(self._encoders)
+
+    def user_features(self):
+        """The per-user feature store (see user_features.py); OSError if none has been built."""
+        return self._fresh(self._user_features)
+
+    def load_all(self):
+        """Eagerly load every model; missing files are logged and skipped."""
+        for name in self.available():
+            try:
+                self.get(name)
+            except OSError as e:
+                logger.warning(f"Could not load model '{name}': {e}")
+        self.encoders()
+        try:
+            self.user_features()
+        except OSError as e:
+            logger.warning(f"No user feature store, every user is cold-start: {e}")
+
+    @staticmethod
+    def _mtime(entry):
+        mtime = os.stat(entry.path).st_mtime_ns
+        if entry.source is None:
+            return mtime
+        try:
+            return mtime, os.stat(entry.source).st_mtime_ns
+        except OSError:
+            return mtime, None
+
+    @staticmethod
+    def _load(entry):
+        obj = entry.loader(entry.path)
+        if entry.source is None or not obj.source_sha256 or not os.path.exists(entry.source):
+            return obj
+        if compact_models.file_digest(entry.source) == obj.source_sha256:
+            return obj
+        logger.warning(f"{entry.source} has changed since its compact export; "
+                       f"serving the pickle until compact_models.py exports it again")
+        return _load_pickle(entry.source)
+
+    def _fresh(self, entry):
+        try:
+            mtime = self._mtime(entry)
+        except OSError:
+            if entry.obj is not None:
+                # File vanished mid-deploy: keep serving what we have.
+                return entry.obj
+            raise
+
+        if entry.obj is not None and entry.mtime == mtime:
+            return entry.obj
+
+        with entry.lock:
+            # Another thread may have reloaded while we waited for the lock.
+            if entry.obj is not None and entry.mtime == mtime:
+                return entry.obj
+            try:
+                obj = self._load(entry)
+            except Exception as e:
+                if entry.obj is None:
+                    raise
+                logger.error(f"Reload of {entry.path} failed, keeping previous version: {e}")
+                # Don't retry the same broken file on every request.
+                entry.mtime = mtime
+                return entry.obj
+            logger.info(f"Loaded {entry.path}")
+            entry.obj = obj
+            entry.mtime = mtime
+            return obj
@@ -0,0 +1,157 @@
+import time
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+from scipy.spatial import cKDTree
+
+from distance import EARTH_RADIUS_KM
+from solver import (DEFAULT_NO_IMPROVEMENT_MS, add_no_improvement_stop, extract_route,
+                    improvement_reporter, search_parameters_for)
+
+DEFAULT_NEIGHBORS = 16
+HILBERT_ORDER = 16
+# Cost reported for arcs outside the allowed successor sets. Local search still
+# prices some of those before the domain rejects them; they can never be used.
+DISALLOWED_ARC_COST = 10 ** 9
+
+
+def unit_vectors(lats, lngs):
+    """Points on the unit sphere; chord length between them is monotone in great-circle distance."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+def knn_graph(lats, lngs, k=DEFAULT_NEIGHBORS):
+    """Sparse k-nearest-neighbour graph over the stops, built with a KD-tree in O(N log N).
+
+    Returns (neighbors, distances_km): two N×k arrays where row i lists the k
+    closest other stops to i, nearest first. Memory is O(N·k).
+    """
+    points = unit_vectors(lats, lngs)
+    n = len(points)
+    k = max(1, min(k, n - 1))
+    chords, neighbors = cKDTree(points).query(points, k=k + 1)
+    # Column 0 is the point itself (chord 0), except for exact duplicates where
+    # the order may swap; drop whichever column holds i.
+    is_self = neighbors == np.arange(n)[:, None]
+    keep = ~is_self
+    keep[keep.sum(axis=1) > k, -1] = False
+    neighbors = neighbors[keep].reshape(n, k).astype(np.int32)
+    chords = chords[keep].reshape(n, k)
+    distances = (2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2, 0.0, 1.0))).astype(np.float32)
+    return neighbors, distances
+
+
+def arc_distances(points, sources, targets):
+    """Great-circle km between pairs of unit_vectors rows, measured as knn_graph measures them."""
+    chords = np.linalg.norm(points[sources] - points[targets], axis=1)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2, 0.0, 1.0))
+
+
+def hilbert_order(lats, lngs, order=HILBERT_ORDER):
+    """Permutation visiting the points along a Hilbert curve; a cheap, local initial tour."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    side = (1 << order) - 1
+
+    def grid(values):
+        span = np.ptp(values)
+        scaled = (values - values.min()) / span if span else np.zeros_like(values)
+        return (scaled * side).astype(np.int64)
+
+    x, y = grid(lngs), grid(lats)
+    d = np.zeros_like(x)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ry == 0
+        mirror = flip & (rx == 1)
+        x = np.where(mirror, side - x, x)
+        y = np.where(mirror, side - y, y)
+        x, y = np.where(flip, y, x), np.where(flip, x, y)
+        s >>= 1
+    return np.argsort(d, kind='stable')
+
+
+def solve_tsp_sparse(lats, lngs, k=DEFAULT_NEIGHBORS, time_limit_ms=None, solution_limit=None,
+                     no_improvement_ms=DEFAULT_NO_IMPROVEMENT_MS, metaheuristic=None,
+                     on_improvement=None):
+    """Solve a TSP over locations (index 0 = depot) on a k-nearest-neighbour arc set.
+
+    Each stop's successor is restricted to its k nearest neighbours, the stops
+    that count it among theirs, the depot, and its successor in a Hilbert-curve
+    start tour (which keeps the model feasible). The search starts from that
+    tour, so no dense N×N matrix is ever built. The integer-meter cost of every
+    allowed arc is computed up front (kNN arcs reuse the graph's distances) and
+    the transit callback only looks it up.
+
+    Returns (route, total_distance_km, stats) like solve_tsp.
+    """
+    started = time.perf_counter()
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    num_locations = len(lats)
+
+    neighbors, distances = knn_graph(lats, lngs, k)
+    initial_tour = (hilbert_order(lats[1:], lngs[1:]) + 1).tolist()
+
+    # arc_costs[i][j]: meters from i to j for every arc the model allows
+    arc_costs = [{} for _ in range(num_locations)]
+    rows = neighbors.tolist()
+    meters = (distances.astype(np.float64) * 1000).astype(np.int64).tolist()
+    for i, (row, costs) in enumerate(zip(rows, meters)):
+        arc_costs[i].update(zip(row, costs))
+    for i, (row, costs) in enumerate(zip(rows, meters)):
+        for j, cost in zip(row, costs):
+            arc_costs[j].setdefault(i, cost)
+    # The rest, in one batch: start-tour arcs, and the depot to and from every stop
+    extra = [(a, b) for a, b in zip(initial_tour, initial_tour[1:]) if b not in arc_costs[a]]
+    extra += [(0, j) for j in range(num_locations) if j not in arc_costs[0]]
+    extra += [(i, 0) for i in range(1, num_locations) if 0 not in arc_costs[i]]
+    if extra:
+        sources, targets = np.array(extra).T
+        costs = (arc_distances(unit_vectors(lats, lngs), sources, targets) * 1000).astype(np.int64)
+        for i, j, cost in zip(sources.tolist(), targets.tolist(), costs.tolist()):
+            arc_costs[i][j] = cost
+
+    manager = pywrapcp.RoutingIndexManager(num_locations, 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    index_nodes = [manager.IndexToNode(index) for index in range(manager.GetNumberOfIndices())]
+
+    def distance_callback(from_index, to_index):
+        return arc_costs[index_nodes[from_index]].get(index_nodes[to_index], DISALLOWED_ARC_COST)
+
+    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    end = routing.End(0)
+    for node in range(1, num_locations):
+        successors = [manager.NodeToIndex(j) for j in arc_costs[node] if j != 0]
+        routing.NextVar(manager.NodeToIndex(node)).SetValues(successors + [end])
+
+    search_parameters, metaheuristic = search_parameters_for(
+        num_locations, time_limit_ms, solution_limit, metaheuristic)
+    progress = add_no_improvement_stop(
+        routing, no_improvement_ms, improvement_reporter(routing, manager, on_improvement))
+
+    setup_ms = round((time.perf_counter() - started) * 1000, 2)
+    routing.CloseModelWithParameters(search_parameters)
+    initial = routing.ReadAssignmentFromRoutes([initial_tour], True)
+    solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+
+    stats = {
+        'objective': solution.ObjectiveValue() if solution else None,
+        'solve_time_ms': round((time.perf_counter() - started) * 1000, 2),
+        'setup_ms': setup_ms,
+        'metaheuristic': metaheuristic,
+        'solutions': progress['solutions'],
+        'neighbors': int(neighbors.shape[1]),
+    }
+    if not solution:
+        return None, None, stats
+    return extract_route(routing, manager, solution), solution.ObjectiveValue() / 1000.0, stats
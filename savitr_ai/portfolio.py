@@ -0,0 +1,101 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from solver import DEFAULT_NO_IMPROVEMENT_MS, DEFAULT_TIME_LIMIT_MS, solve_tsp
+from solver_pool import PoolBusy, SolverPool, share_array
+
+# (first solution strategy, metaheuristic) pairs raced by default; they win on
+# different layouts (savings on clustered stops, Christofides on spread-out ones)
+DEFAULT_PORTFOLIO = (
+    ('PATH_CHEAPEST_ARC', 'GUIDED_LOCAL_SEARCH'),
+    ('SAVINGS', 'GUIDED_LOCAL_SEARCH'),
+    ('CHRISTOFIDES', 'GUIDED_LOCAL_SEARCH'),
+    ('PATH_CHEAPEST_ARC', 'SIMULATED_ANNEALING'),
+)
+
+
+def solve_portfolio(distance_matrix, strategies=DEFAULT_PORTFOLIO, pool=None, time_limit_ms=None,
+                    no_improvement_ms=DEFAULT_NO_IMPROVEMENT_MS, solution_limit=None, workers=None):
+    """Race several search strategies on one TSP and keep the shortest tour.
+
+    Each (first_solution, metaheuristic) pair is solved in its own process on
+    `pool` (a SolverPool; a temporary one of `workers` processes, default
+    one per strategy, otherwise), with the matrix shared through shared
+    memory. `time_limit_ms` is the wall-clock budget for the whole portfolio:
+    members run side by side with the full budget when the pool has a worker
+    for each, in shorter rounds otherwise. Members the pool turns away are
+    skipped; PoolBusy is raised only if none could run. With no pool and
+    `workers=1` the members take turns in this process instead.
+
+    Returns (route, total_distance_km, stats) like solve_tsp; stats name the
+    winning `strategy` and list every member's result under `portfolio`.
+    """
+    started = time.perf_counter()
+    if pool is None and workers == 1:
+        member_limit_ms = int(time_limit_ms or DEFAULT_TIME_LIMIT_MS) // len(strategies)
+        results = [
+            solve_tsp(distance_matrix, time_limit_ms=member_limit_ms, no_improvement_ms=no_improvement_ms,
+                      solution_limit=solution_limit, metaheuristic=metaheuristic,
+                      first_solution=first_solution)
+            for first_solution, metaheuristic in strategies
+        ]
+    else:
+        results = _race(distance_matrix, strategies, pool, workers or len(strategies), time_limit_ms,
+                        no_improvement_ms, solution_limit)
+
+    members = []
+    best = None
+    for (first_solution, metaheuristic), result in zip(strategies, results):
+        member = {'first_solution': first_solution, 'metaheuristic': metaheuristic}
+        if isinstance(result, PoolBusy):
+            member['skipped'] = True
+        else:
+            route, total_distance, stats = result
+            member.update(objective=stats['objective'], solve_time_ms=stats['solve_time_ms'])
+            if route and (best is None or stats['objective'] < best[2]['objective']):
+                best = result
+        members.append(member)
+
+    if all(isinstance(result, PoolBusy) for result in results):
+        raise PoolBusy(max(result.retry_after for result in results))
+
+    stats = {
+        'solve_time_ms': round((time.perf_counter() - started) * 1000, 2),
+        'portfolio': members,
+    }
+    if best is None:
+        return None, None, dict(stats, objective=None, metaheuristic=None, strategy=None)
+    route, total_distance, best_stats = best
+    return route, total_distance, dict(
+        stats,
+        objective=best_stats['objective'],
+        metaheuristic=best_stats['metaheuristic'],
+        strategy=f"{best_stats['first_solution']}/{best_stats['metaheuristic']}",
+    )
+
+
+def _race(distance_matrix, strategies, pool, workers, time_limit_ms, no_improvement_ms, solution_limit):
+    """Each member's solve_tsp result, or PoolBusy if the pool turned it away."""
+    owned = pool is None
+    if owned:
+        pool = SolverPool(max_workers=workers, max_queue=0)
+    rounds = math.ceil(len(strategies) / pool.max_workers)
+    member_limit_ms = int(time_limit_ms or DEFAULT_TIME_LIMIT_MS) // rounds
+
+    def run(strategy):
+        first_solution, metaheuristic = strategy
+        try:
+            return pool.run(solve_tsp, shared, time_limit_ms=member_limit_ms,
+                            no_improvement_ms=no_improvement_ms, solution_limit=solution_limit,
+                            metaheuristic=metaheuristic, first_solution=first_solution)
+        except PoolBusy as e:
+            return e
+
+    try:
+        with share_array(distance_matrix) as shared:
+            with ThreadPoolExecutor(max_workers=len(strategies)) as threads:
+                return list(threads.map(run, strategies))
+    finally:
+        if owned:
+            pool.shutdown()
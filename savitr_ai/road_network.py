@@ -0,0 +1,447 @@
+"""Road-network travel costs from a local OpenStreetMap extract.
+
+Straight-line (haversine) distances badly underestimate travel in dense
+cities, so routes and ETAs can come from the road graph instead. The graph
+is built offline from an .osm / .osm.xml (stdlib parser) or .osm.pbf extract
+(needs the optional `osmium` package): ways are split only at intersections
+and dead ends, so shape points cost nothing at query time. It is held as
+CSR arrays (float32 km and seconds per edge) and compiled once to an .npz
+that later loads in a single read:
+
+    python road_network.py kolkata.osm.pbf --out kolkata.npz --bench 1000
+
+Many-to-many matrices run scipy's Dijkstra from every distinct snapped
+source, bounded by a multiple of the straight-line distance to its farthest
+stop, in blocks so the (sources x nodes) working set stays bounded. With a
+solver pool attached, large matrices split their sources over its workers.
+Coordinates are snapped to the nearest graph node through a k-d tree and
+the node ids are cached per coordinate. Stops further than `max_snap_km`
+from any road, and pairs the graph cannot connect, fall back to haversine.
+
+Set ROAD_NETWORK_PATH to a compiled .npz (or a raw extract) to route on it;
+without it every cost is haversine, as before.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from distance import BLOCK_CELLS, EARTH_RADIUS_KM, HaversineCosts, haversine_matrix
+from solver_pool import PoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Assumed urban speeds (km/h) by highway=* tag when a way has no usable maxspeed
+SPEEDS_KMPH = {
+    'motorway': 60, 'motorway_link': 40,
+    'trunk': 45, 'trunk_link': 30,
+    'primary': 30, 'primary_link': 25,
+    'secondary': 25, 'secondary_link': 20,
+    'tertiary': 22, 'tertiary_link': 18,
+    'unclassified': 18, 'residential': 15, 'living_street': 8, 'service': 10, 'road': 15,
+}
+# Walking-pace access from a stop to its snapped node
+ACCESS_SPEED_KMPH = 5.0
+# Speed for haversine fallback times (off-network stops, disconnected pairs)
+FALLBACK_SPEED_KMPH = SPEEDS_KMPH['residential']
+DEFAULT_MAX_SNAP_KM = 1.0
+# Each source's Dijkstra stops once costs pass this multiple of the straight-line
+# distance to its farthest stop: delivery stops cover a few km of a city-wide
+# graph, and a bounded search settles a small fraction of its nodes (sources left
+# with unreached stops are searched again without a limit)
+SEARCH_LIMIT_FACTOR = 2.0
+# Sources per Dijkstra call
+SOURCE_BLOCK = 16
+ONEWAY_FORWARD = {'yes', 'true', '1'}
+# Coordinates whose snapped node is remembered
+SNAP_CACHE_SIZE = 100_000
+WEIGHTS = ('distance', 'time')
+
+
+def _way_speed(tags):
+    maxspeed = tags.get('maxspeed', '')
+    try:
+        value = float(maxspeed.split()[0])
+        return value * 1.609 if 'mph' in maxspeed else value
+    except (ValueError, IndexError):
+        return SPEEDS_KMPH[tags['highway']]
+
+
+def _way_direction(tags):
+    """1 forward only, -1 reverse only, 0 both ways."""
+    oneway = tags.get('oneway', '')
+    if oneway == '-1':
+        return -1
+    if oneway in ONEWAY_FORWARD or tags.get('junction') == 'roundabout' or tags['highway'] == 'motorway':
+        return 1
+    return 0
+
+
+def _parse_xml(path):
+    """(node id -> (lat, lon), [(refs, speed_kmph, direction)]) from an .osm XML extract."""
+    coords, ways = {}, []
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag == 'node':
+            coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+        elif elem.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+            if tags.get('highway') in SPEEDS_KMPH and tags.get('access') not in ('no', 'private'):
+                refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                ways.append((refs, _way_speed(tags), _way_direction(tags)))
+        elif elem.tag != 'relation':
+            continue
+        elem.clear()
+    return coords, ways
+
+
+def _parse_pbf(path):
+    import osmium
+
+    coords, ways = {}, []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            coords[n.id] = (n.location.lat, n.location.lon)
+
+        def way(self, w):
+            tags = dict(w.tags)
+            if tags.get('highway') in SPEEDS_KMPH and tags.get('access') not in ('no', 'private'):
+                ways.append(([nd.ref for nd in w.nodes], _way_speed(tags), _way_direction(tags)))
+
+    Handler().apply_file(path)
+    return coords, ways
+
+
+def build_graph(coords, ways):
+    """Compact graph arrays from parsed OSM nodes and highway ways.
+
+    Graph vertices are way endpoints and nodes shared by several ways; the
+    points in between only add length to the edge that passes through them.
+    """
+    uses = {}
+    for refs, _, _ in ways:
+        for ref in refs:
+            uses[ref] = uses.get(ref, 0) + 1
+    vertex = {}
+    rows, cols, km, seconds = [], [], [], []
+    for refs, speed, direction in ways:
+        refs = [ref for ref in refs if ref in coords]
+        if len(refs) < 2:
+            continue
+        lats = np.fromiter((coords[r][0] for r in refs), dtype=np.float64, count=len(refs))
+        lngs = np.fromiter((coords[r][1] for r in refs), dtype=np.float64, count=len(refs))
+        segment_km = _segment_km(lats, lngs)
+        start, length = refs[0], 0.0
+        for i in range(1, len(refs)):
+            length += segment_km[i - 1]
+            ref = refs[i]
+            if i < len(refs) - 1 and uses[ref] < 2:
+                continue
+            a = vertex.setdefault(start, len(vertex))
+            b = vertex.setdefault(ref, len(vertex))
+            if a != b:
+                travel = length / speed * 3600.0
+                if direction >= 0:
+                    rows.append(a), cols.append(b), km.append(length), seconds.append(travel)
+                if direction <= 0:
+                    rows.append(b), cols.append(a), km.append(length), seconds.append(travel)
+            start, length = ref, 0.0
+
+    ids = np.empty(len(vertex), dtype=np.int64)
+    ids[list(vertex.values())] = list(vertex.keys())
+    lat = np.fromiter((coords[i][0] for i in ids), dtype=np.float64, count=len(ids))
+    lng = np.fromiter((coords[i][1] for i in ids), dtype=np.float64, count=len(ids))
+    return _to_csr(lat, lng, np.asarray(rows), np.asarray(cols), np.asarray(km), np.asarray(seconds))
+
+
+def _pairwise_km(lats1, lngs1, lats2, lngs2):
+    """Great-circle km between point i of set 1 and point i of set 2."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lats1, lngs1, lats2, lngs2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _segment_km(lats, lngs):
+    return _pairwise_km(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+
+
+def _to_csr(lat, lng, rows, cols, km, seconds):
+    # Parallel edges: keep the shortest, since csr_matrix would add them up
+    order = np.lexsort((km, cols, rows))
+    rows, cols, km, seconds = rows[order], cols[order], km[order], seconds[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    rows, cols, km, seconds = rows[first], cols[first], km[first], seconds[first]
+    indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(lat)), out=indptr[1:])
+    # Zero-length edges would read as "no edge" in some csgraph paths
+    floor = np.float32(1e-6)
+    return {
+        'lat': lat, 'lng': lng, 'indptr': indptr, 'indices': cols.astype(np.int32),
+        'km': np.maximum(km.astype(np.float32), floor),
+        'seconds': np.maximum(seconds.astype(np.float32), floor),
+    }
+
+
+class RoadNetwork:
+    """Many-to-many road costs over a CSR graph; drop-in for haversine_matrix."""
+
+    def __init__(self, arrays, path=None, max_snap_km=DEFAULT_MAX_SNAP_KM):
+        self.path = path
+        self.max_snap_km = max_snap_km
+        # Identifies this graph in route cache keys; a rebuilt file gets a new one
+        source = f"{os.path.abspath(path)}@{os.stat(path).st_mtime_ns}" if path else f"arrays@{id(arrays)}"
+        self.key = f"road:{source}:{max_snap_km}"
+        self.lat = np.asarray(arrays['lat'])
+        self.lng = np.asarray(arrays['lng'])
+        shape = (len(self.lat), len(self.lat))
+        graph = (arrays['indptr'], arrays['indices'])
+        self.graphs = {
+            'distance': csr_matrix((arrays['km'], graph[1], graph[0]), shape=shape),
+            'time': csr_matrix((arrays['seconds'], graph[1], graph[0]), shape=shape),
+        }
+        self._tree = None
+        self._snapped = OrderedDict()
+        self._lock = threading.Lock()
+        # A SolverPool to spread large matrices over; workers get the graph by path
+        self.pool = None
+
+    def __reduce__(self):
+        # Solver and job processes reload the graph from disk instead of pickling it
+        return load_cached, (self.path, self.max_snap_km)
+
+    @property
+    def nodes(self):
+        return len(self.lat)
+
+    def snap(self, lats, lngs):
+        """(nearest graph node per coordinate, straight-line km to it)."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        nodes = np.empty(len(lats), dtype=np.int64)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(zip(lats.tolist(), lngs.tolist())):
+                node = self._snapped.get(key)
+                if node is None:
+                    missing.append(i)
+                else:
+                    nodes[i] = node
+                    self._snapped.move_to_end(key)
+        if missing:
+            _, found = self._kdtree().query(_unit_vectors(lats[missing], lngs[missing]))
+            nodes[missing] = found
+            with self._lock:
+                for i, node in zip(missing, found.tolist()):
+                    self._snapped[(lats[i].item(), lngs[i].item())] = node
+                while len(self._snapped) > SNAP_CACHE_SIZE:
+                    self._snapped.popitem(last=False)
+        return nodes, _pairwise_km(lats, lngs, self.lat[nodes], self.lng[nodes])
+
+    def _kdtree(self):
+        if self._tree is None:
+            self._tree = cKDTree(_unit_vectors(self.lat, self.lng))
+        return self._tree
+
+    def cost_matrix(self, lats, lngs, weight='distance'):
+        """N x N road costs between coordinates: km for 'distance', seconds for 'time'.
+
+        Costs include the straight-line legs between each stop and its snapped
+        node. Off-network stops and pairs with no road between them get
+        haversine costs.
+        """
+        if weight not in WEIGHTS:
+            raise ValueError(f"weight must be one of {', '.join(WEIGHTS)}")
+        n = len(lats)
+        nodes, offsets = self.snap(lats, lngs)
+        unique, inverse = np.unique(nodes, return_inverse=True)
+        # Search radius per source; sources are run in blocks of similar radius
+        limits = SEARCH_LIMIT_FACTOR * haversine_matrix(self.lat[unique], self.lng[unique]).max(axis=1)
+        limits += 2 * self.max_snap_km
+        if weight == 'time':
+            limits *= 3600.0 / FALLBACK_SPEED_KMPH
+        by_limit = np.argsort(limits)
+        between = np.empty((len(unique), len(unique)), dtype=np.float64)
+        parts = [by_limit[chunk] for chunk in self._chunks(len(unique))]
+        if len(parts) > 1:
+            with ThreadPoolExecutor(max_workers=len(parts)) as threads:
+                rows = threads.map(lambda part: self._pooled_rows(weight, unique[part], limits[part], unique), parts)
+                for part, part_rows in zip(parts, rows):
+                    between[part] = part_rows
+        else:
+            between[by_limit] = source_rows(self, weight, unique[by_limit], limits[by_limit], unique)
+        # A road route can be longer than the limit allows (a river crossing, a
+        # one-way detour): search those sources again, unbounded
+        capped = np.flatnonzero(~np.isfinite(between).all(axis=1))
+        if capped.size:
+            between[capped] = source_rows(self, weight, unique[capped], np.full(capped.size, np.inf), unique)
+            logger.info(f"Searched {capped.size} of {len(unique)} sources again without a limit")
+
+        costs = between[np.ix_(inverse, inverse)]
+        access = offsets if weight == 'distance' else offsets / ACCESS_SPEED_KMPH * 3600.0
+        costs += access[:, None]
+        costs += access[None, :]
+
+        fallback = ~np.isfinite(costs)
+        off_network = offsets > self.max_snap_km
+        fallback[off_network, :] = True
+        fallback[:, off_network] = True
+        if fallback.any():
+            straight = haversine_matrix(lats, lngs)
+            if weight == 'time':
+                straight *= 3600.0 / FALLBACK_SPEED_KMPH
+            costs[fallback] = straight[fallback]
+            logger.warning(f"Road costs fell back to haversine for {int(fallback.sum())} of {n * n} pairs "
+                           f"({int(off_network.sum())} of {n} stops off the network)")
+        np.fill_diagonal(costs, 0)
+        return costs
+
+    def _chunks(self, sources):
+        """Source ranges to spread over the solver pool; one range when there is no pool."""
+        workers = self.pool.max_workers if self.pool is not None else 1
+        count = max(1, min(workers, sources // (2 * SOURCE_BLOCK)))
+        bounds = np.linspace(0, sources, count + 1).astype(int)
+        return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def _pooled_rows(self, weight, sources, limits, targets):
+        try:
+            return self.pool.run(source_rows, self, weight, sources, limits, targets)
+        except PoolBusy:
+            # Every worker is solving; compute this part in the request thread
+            return source_rows(self, weight, sources, limits, targets)
+
+    def matrix(self, lats, lngs):
+        """Road distance matrix in km, the same shape and units as haversine_matrix."""
+        return self.cost_matrix(lats, lngs, 'distance')
+
+    def travel_minutes(self, lats, lngs):
+        """Driving time matrix in minutes."""
+        return self.cost_matrix(lats, lngs, 'time') / 60.0
+
+
+def source_rows(network, weight, sources, limits, targets):
+    """Graph costs from each source node to the target nodes, searching no further than its limit.
+
+    Sources come sorted by limit, and run in blocks that share the largest
+    limit of the block; the (sources x all nodes) Dijkstra output per block
+    stays as bounded as haversine_matrix's blocks.
+    """
+    graph = network.graphs[weight]
+    rows = np.empty((len(sources), len(targets)), dtype=np.float64)
+    block = max(1, min(SOURCE_BLOCK, BLOCK_CELLS // max(network.nodes, 1)))
+    for start in range(0, len(sources), block):
+        stop = start + block
+        reached = dijkstra(graph, directed=True, indices=sources[start:stop], limit=limits[start:stop].max())
+        rows[start:stop] = reached[:, targets]
+    return rows
+
+
+def _unit_vectors(lats, lngs):
+    lat, lng = np.radians(lats), np.radians(lngs)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def compile_extract(path):
+    """Parse an OSM extract into graph arrays."""
+    started = time.perf_counter()
+    coords, ways = _parse_pbf(path) if path.endswith('.pbf') else _parse_xml(path)
+    arrays = build_graph(coords, ways)
+    logger.info(f"Built road graph from {path}: {len(arrays['lat'])} nodes, "
+                f"{len(arrays['indices'])} edges in {time.perf_counter() - started:.1f} s")
+    return arrays
+
+
+def save(arrays, path):
+    np.savez(path, **arrays)
+
+
+def load(path, max_snap_km=DEFAULT_MAX_SNAP_KM):
+    """Load a compiled .npz graph (memory-mapped) or compile a raw extract."""
+    if path.endswith('.npz'):
+        # np.load cannot memory-map inside an .npz, so members are read once here
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+    else:
+        arrays = compile_extract(path)
+    return RoadNetwork(arrays, path, max_snap_km)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_cached(path, max_snap_km=DEFAULT_MAX_SNAP_KM):
+    """load(), once per process and path."""
+    with _loaded_lock:
+        network = _loaded.get((path, max_snap_km))
+        if network is None:
+            network = _loaded[(path, max_snap_km)] = load(path, max_snap_km)
+        return network
+
+
+def cost_provider_from_env(pool=None):
+    """RoadNetwork for ROAD_NETWORK_PATH, or haversine when it is unset or fails to load.
+
+    `pool` is a SolverPool large matrices may spread their Dijkstra runs over.
+    """
+    path = os.environ.get('ROAD_NETWORK_PATH')
+    if not path:
+        return HaversineCosts()
+    max_snap_km = float(os.environ.get('ROAD_NETWORK_MAX_SNAP_KM', DEFAULT_MAX_SNAP_KM))
+    try:
+        network = load_cached(path, max_snap_km)
+    except Exception as e:
+        logger.error(f"Could not load road network {path}, using haversine: {e}")
+        return HaversineCosts()
+    network.pool = pool
+    logger.info(f"Routing on road network {path} ({network.nodes} nodes)")
+    return network
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile an OSM extract into a road graph .npz.')
+    parser.add_argument('extract', help='.osm / .osm.xml / .osm.pbf file, or a compiled .npz')
+    parser.add_argument('--out', help='where to write the compiled .npz')
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help='time an N x N distance matrix between random graph nodes')
+    parser.add_argument('--area-km', type=float,
+                        help='with --bench, pick the nodes from a square of this size (default: whole graph)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    network = load(args.extract)
+    if args.out:
+        save({'lat': network.lat, 'lng': network.lng, 'indptr': network.graphs['distance'].indptr,
+              'indices': network.graphs['distance'].indices, 'km': network.graphs['distance'].data,
+              'seconds': network.graphs['time'].data}, args.out)
+        logger.info(f"Wrote {args.out}")
+    if args.bench:
+        rng = np.random.default_rng(0)
+        candidates = np.arange(network.nodes)
+        if args.area_km:
+            # Square anchored at a random node; 1 degree of latitude is ~111 km
+            corner = rng.integers(network.nodes)
+            half = args.area_km / 111.0
+            candidates = candidates[(np.abs(network.lat - network.lat[corner]) < half)
+                                    & (np.abs(network.lng - network.lng[corner]) < half)]
+        picks = rng.choice(candidates, size=min(args.bench, len(candidates)), replace=False)
+        started = time.perf_counter()
+        costs = network.matrix(network.lat[picks], network.lng[picks])
+        elapsed = time.perf_counter() - started
+        straight = haversine_matrix(network.lat[picks], network.lng[picks])
+        ratio = np.median(costs[straight > 0] / straight[straight > 0])
+        print(f"{len(picks)}x{len(picks)} matrix on {network.nodes} nodes: {elapsed:.2f} s "
+              f"(median road/straight-line ratio {ratio:.2f})")
+
+
+if __name__ == '__main__':
+    main()
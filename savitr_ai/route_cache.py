@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ~1 m at Kolkata's latitude: refreshes that jitter below this still hit
+COORD_DECIMALS = 5
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_DISK_MAX_ENTRIES = 4096
+
+
+def canonical_stops(source_point, lats, lngs, decimals=COORD_DECIMALS):
+    """Canonical form of a stop set: (rounded depot, rounded stops sorted, order).
+
+    `order[p]` is the request index of the stop at canonical position p, so a
+    route computed for one ordering of the same stops can be replayed for another.
+    """
+    lats = np.round(np.asarray(lats, dtype=np.float64), decimals)
+    lngs = np.round(np.asarray(lngs, dtype=np.float64), decimals)
+    order = np.lexsort((lngs, lats))
+    depot = (round(float(source_point[0]), decimals), round(float(source_point[1]), decimals))
+    return depot, np.column_stack((lats[order], lngs[order])), order
+
+
+def route_key(source_point, lats, lngs, params):
+    """Hash (depot, rounded stop set, solver params) into a cache key; returns (key, order)."""
+    depot, stops, order = canonical_stops(source_point, lats, lngs)
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'depot': depot, 'params': params}, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(stops).tobytes())
+    return digest.hexdigest(), order
+
+
+def matrix_key(lats, lngs):
+    """Exact key for the distance matrix over these locations in this order."""
+    digest = hashlib.sha256(np.ascontiguousarray(lats, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(lngs, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def to_canonical(route, order):
+    """Rewrite a route of location indices (0 = depot) into canonical positions."""
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    return [0 if node == 0 else int(position[node - 1]) + 1 for node in route]
+
+
+def from_canonical(route, order):
+    """Inverse of to_canonical for the ordering of the current request."""
+    return [0 if node == 0 else int(order[node - 1]) + 1 for node in route]
+
+
+class RouteCache:
+    """LRU cache of solved routes, optionally backed by a SQLite file.
+
+    The in-process layer answers repeat requests within one worker; the disk
+    layer (enabled with `disk_path`) is shared by every gunicorn worker on the
+    host. Both layers are bounded and evict least-recently-used entries.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_path=None,
+                 disk_max_entries=DEFAULT_DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_path:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS routes '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._disk_get(key) if self.disk_path else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.disk_path:
+            self._disk_put(key, value)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute('SELECT value FROM routes WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE routes SET used = ? WHERE key = ?', (time.time(), key))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"Route cache read failed: {e}")
+            return None
+
+    def _disk_put(self, key, value):
+        try:
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO routes (key, value, used) VALUES (?, ?, ?)',
+                             (key, json.dumps(value), time.time()))
+                conn.execute(
+                    'DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY used DESC '
+                    'LIMIT -1 OFFSET ?)', (self.disk_max_entries,))
+        except sqlite3.Error as e:
+            logger.warning(f"Route cache write failed: {e}")
+
+
+def route_cache_from_env():
+    """RouteCache configured by ROUTE_CACHE_SIZE / ROUTE_CACHE_PATH / ROUTE_CACHE_DISK_SIZE."""
+    return RouteCache(
+        max_entries=int(os.environ.get('ROUTE_CACHE_SIZE', DEFAULT_MAX_ENTRIES)),
+        disk_path=os.environ.get('ROUTE_CACHE_PATH') or None,
+        disk_max_entries=int(os.environ.get('ROUTE_CACHE_DISK_SIZE', DEFAULT_DISK_MAX_ENTRIES)),
+    )
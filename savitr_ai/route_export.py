@@ -0,0 +1,255 @@
+"""Route output: GeoJSON, encoded polylines, the HTML report and the folium map.
+
+Everything works on coordinate arrays plus index arrays into them (a stop
+order, a vehicle's route), so gathering a route is one fancy-indexing step
+instead of a DataFrame pass per output. The GeoJSON and HTML writers yield
+text in chunks of CHUNK_POINTS stops: an HTTP response can stream them and a
+file is written piece by piece, so no output is ever built as one string.
+Nothing here needs the distance matrix.
+"""
+import html
+import json
+import math
+
+import numpy as np
+
+# Stops per yielded chunk of GeoJSON / HTML
+CHUNK_POINTS = 2000
+# Google encoded polyline precision (1e-5 degrees, ~1 m); OSRM and Valhalla use 6
+POLYLINE_PRECISION = 5
+SVG_WIDTH = 600
+SVG_HEIGHT = 400
+SVG_PADDING = 50
+
+
+def route_indices(route, closed=True):
+    """The route as an index array, with the start repeated at the end if `closed`."""
+    route = np.asarray(route, dtype=np.int64)
+    if closed and len(route) > 1 and route[-1] != route[0]:
+        route = np.append(route, route[0])
+    return route
+
+
+def encode_polyline(lats, lngs, precision=POLYLINE_PRECISION):
+    """Encode coordinates in the Google encoded polyline format.
+
+    Each coordinate becomes a delta from the previous one, zigzag-encoded and
+    split into 5-bit groups; all of it is done on whole arrays.
+    """
+    factor = 10 ** precision
+    points = np.column_stack([np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)])
+    if not len(points):
+        return ''
+    scaled = np.round(points * factor).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = (deltas << 1) ^ (deltas >> 63)
+    # int64 deltas of whole-degree coordinates need at most 7 groups
+    shifts = np.arange(0, 35, 5)
+    shifted = values[:, None] >> shifts
+    groups = shifted & 31
+    count = np.maximum(1, (shifted > 0).sum(axis=1))
+    position = np.arange(len(shifts))
+    groups[position < count[:, None] - 1] |= 0x20
+    groups += 63
+    return groups[position < count[:, None]].astype(np.uint8).tobytes().decode('ascii')
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """(lats, lngs) from an encoded polyline; the inverse of encode_polyline."""
+    chars = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if not len(chars):
+        return np.empty(0), np.empty(0)
+    last = (chars & 0x20) == 0
+    value_id = np.concatenate([[0], np.cumsum(last)[:-1]])
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    position = np.arange(len(chars)) - starts[value_id]
+    values = np.zeros(len(starts), dtype=np.int64)
+    np.add.at(values, value_id, (chars & 31) << (5 * position))
+    deltas = (values >> 1) ^ -(values & 1)
+    points = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+    return points[:, 0], points[:, 1]
+
+
+def _json_properties(properties):
+    """json.dumps for a properties dict, with NaN (pandas' missing value) as null."""
+    return json.dumps({key: None if isinstance(value, float) and math.isnan(value) else value
+                       for key, value in properties.items()}, default=_json_default)
+
+
+def _json_default(value):
+    # numpy scalars from DataFrame records
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_geojson(lats, lngs, stops, stop_properties=None, lines=()):
+    """Yield a GeoJSON FeatureCollection in text chunks.
+
+    `stops` indexes the coordinates to emit as Point features, in order, with
+    `stop_properties[i]` (a dict) on the i-th one. `lines` is a sequence of
+    (indices, properties) pairs, each emitted as a LineString.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    stops = np.asarray(stops, dtype=np.int64)
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    for start in range(0, len(stops), CHUNK_POINTS):
+        chunk = stops[start:start + CHUNK_POINTS]
+        coordinates = np.column_stack([lngs[chunk], lats[chunk]]).tolist()
+        properties = (stop_properties[start:start + len(chunk)] if stop_properties is not None
+                      else [{}] * len(chunk))
+        features = ','.join(
+            '{"type":"Feature","properties":%s,"geometry":{"type":"Point","coordinates":%s}}'
+            % (_json_properties(props), json.dumps(point))
+            for props, point in zip(properties, coordinates))
+        yield features if first else ',' + features
+        first = False
+    for indices, properties in lines:
+        indices = np.asarray(indices, dtype=np.int64)
+        yield ('' if first else ',') + '{"type":"Feature","properties":%s,' \
+            '"geometry":{"type":"LineString","coordinates":[' % _json_properties(properties)
+        first = False
+        for start in range(0, len(indices), CHUNK_POINTS):
+            chunk = indices[start:start + CHUNK_POINTS]
+            coordinates = json.dumps(np.column_stack([lngs[chunk], lats[chunk]]).tolist())[1:-1]
+            yield coordinates if start == 0 else ',' + coordinates
+        yield ']}}'
+    yield ']}'
+
+
+def write_geojson(path, lats, lngs, stops, stop_properties=None, lines=()):
+    with open(path, 'w', encoding='utf-8') as file:
+        for text in iter_geojson(lats, lngs, stops, stop_properties, lines):
+            file.write(text)
+
+
+def svg_points(lats, lngs, width=SVG_WIDTH, height=SVG_HEIGHT, padding=SVG_PADDING):
+    """Scale coordinates into an SVG viewport (north up); (x, y) arrays."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+
+    def scale(values, size, flip):
+        span = values.max() - values.min() if len(values) else 0
+        if span == 0:
+            return np.full(len(values), size / 2)
+        fraction = (values - values.min()) / span
+        return padding + (size - 2 * padding) * (1 - fraction if flip else fraction)
+
+    return scale(lngs, width, False), scale(lats, height, True)
+
+
+REPORT_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>TSP Route Visualization</title>
+<style>
+body { font-family: Arial, sans-serif; margin: 20px; }
+.container { max-width: 800px; margin: 0 auto; }
+table { border-collapse: collapse; width: 100%; margin-top: 20px; }
+th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+th { background-color: #f2f2f2; }
+tr:nth-child(even) { background-color: #f9f9f9; }
+.route-info { background-color: #e9f7ef; padding: 15px; border-radius: 5px; margin-bottom: 20px; }
+svg { max-width: 100%; height: auto; border: 1px solid #ddd; margin: 20px 0; }
+</style>
+</head>
+<body>
+<div class="container">
+<h1>TSP Route Visualization</h1>
+"""
+
+
+def iter_report(lats, lngs, route, total_distance, columns=None):
+    """Yield the static HTML route report: summary, stop table and an SVG sketch.
+
+    `route` indexes the coordinates in visiting order (start first, not
+    repeated). `columns` maps table headings to per-stop values in route
+    order, shown after the stop number and coordinates.
+    """
+    route = np.asarray(route, dtype=np.int64)
+    columns = columns or {}
+    route_lats, route_lngs = np.asarray(lats)[route], np.asarray(lngs)[route]
+    yield REPORT_HEAD
+    yield ('<div class="route-info">\n<h3>Route Summary</h3>\n'
+           f'<p><strong>Total Distance:</strong> {total_distance:.2f} km</p>\n'
+           f'<p><strong>Number of Points:</strong> {len(route)}</p>\n'
+           f'<p><strong>Route Order:</strong> {" → ".join(map(str, route.tolist()))}</p>\n</div>\n')
+
+    headings = ['Stop #', 'Latitude', 'Longitude', *columns]
+    yield '<h3>Route Points</h3>\n<table>\n<tr>%s</tr>\n' % ''.join(
+        f'<th>{html.escape(str(heading))}</th>' for heading in headings)
+    values = [list(column) for column in columns.values()]
+    for start in range(0, len(route), CHUNK_POINTS):
+        stop = min(start + CHUNK_POINTS, len(route))
+        cells = zip(range(start, stop), route_lats[start:stop].tolist(), route_lngs[start:stop].tolist(),
+                    *(column[start:stop] for column in values))
+        yield ''.join('<tr>%s</tr>\n' % ''.join(f'<td>{html.escape(str(cell))}</td>' for cell in row)
+                      for row in cells)
+    yield '</table>\n'
+
+    x, y = svg_points(route_lats, route_lngs)
+    closed = route_indices(np.arange(len(route)))
+    yield (f'<h3>Simple Route Visualization</h3>\n'
+           f'<svg width="{SVG_WIDTH}" height="{SVG_HEIGHT}" xmlns="http://www.w3.org/2000/svg">'
+           '<path d="M%s" stroke="blue" stroke-width="2" fill="none" />'
+           % ' L'.join(f'{px:.1f},{py:.1f}' for px, py in zip(x[closed].tolist(), y[closed].tolist())))
+    for start in range(0, len(route), CHUNK_POINTS):
+        stop = min(start + CHUNK_POINTS, len(route))
+        yield ''.join(
+            f'<circle cx="{px:.1f}" cy="{py:.1f}" r="5" fill="{"red" if i == 0 else "blue"}" />'
+            f'<text x="{px + 10:.1f}" y="{py:.1f}" font-size="12">{i}</text>'
+            for i, px, py in zip(range(start, stop), x[start:stop].tolist(), y[start:stop].tolist()))
+    yield '</svg>\n</div>\n</body>\n</html>\n'
+
+
+def write_report(path, lats, lngs, route, total_distance, columns=None):
+    with open(path, 'w', encoding='utf-8') as file:
+        for text in iter_report(lats, lngs, route, total_distance, columns):
+            file.write(text)
+
+
+def folium_map(lats, lngs, route, total_distance, popups=None, zoom_start=4):
+    """Interactive folium map of a route: depot and stop markers, the path and a legend.
+
+    `popups[i]` is the popup HTML of the i-th stop in `route` (route[0] is the depot).
+    """
+    import folium
+    from folium import plugins
+
+    route = np.asarray(route, dtype=np.int64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    route_map = folium.Map(location=[lats.mean(), lngs.mean()], zoom_start=zoom_start)
+
+    points = np.column_stack([lats[route], lngs[route]]).tolist()
+    for i, point in enumerate(points):
+        popup = folium.Popup(popups[i], max_width=300) if popups is not None else None
+        if i == 0:
+            folium.Marker(location=point, popup=popup, icon=folium.Icon(color='red', icon='home')).add_to(route_map)
+        else:
+            folium.Marker(location=point, popup=popup, icon=folium.Icon(color='blue', icon='info-sign'),
+                          tooltip=f"Stop {i}").add_to(route_map)
+
+    closed = route_indices(route)
+    path = np.column_stack([lats[closed], lngs[closed]]).tolist()
+    folium.PolyLine(path, color='blue', weight=2.5, opacity=0.8,
+                    tooltip=f"Total Distance: {total_distance:.2f} km").add_to(route_map)
+    plugins.AntPath(locations=path, dash_array=[10, 20], delay=1000, color='red',
+                    pulse_color='black', tooltip="Route Path").add_to(route_map)
+
+    legend = f'''
+    <div style="position: fixed; bottom: 50px; left: 50px; width: 220px; height: 90px;
+                border:2px solid grey; z-index:9999; font-size:14px; background-color:white;
+                padding: 10px; border-radius: 5px;">
+      <b>TSP Solution</b><br>
+      Total Distance: {total_distance:.2f} km<br>
+      Points: {len(route)}<br>
+      <span style="color:red;">&#8226;</span> Depot ({lats[route[0]]:.2f},{lngs[route[0]]:.2f})<br>
+      <span style="color:blue;">&#8226;</span> Delivery Points
+    </div>
+    '''
+    route_map.get_root().html.add_child(folium.Element(legend))
+    return route_map
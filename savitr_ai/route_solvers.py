@@ -0,0 +1,33 @@
+from clustering import solve_clustered
+from distance import haversine_matrix
+from neighbors import solve_tsp_sparse
+from portfolio import solve_portfolio
+from solver import solve_tsp
+
+
+def solve_route(mode, lats, lngs, route_params, solve_options, matrix_for=haversine_matrix,
+                on_improvement=None, processes=None):
+    """Solve a tsp or cluster request over location coordinates (index 0 = depot).
+
+    `matrix_for(lats, lngs)` builds the dense matrices of plain TSP, portfolio
+    and cluster solves; the sparse `neighbors` arc set is always priced by
+    straight-line distance. Cluster and portfolio solves fan out over up to
+    `processes` processes (default: one per core or strategy; 1 runs their
+    parts one after another here) and do not report the `on_improvement` hook
+    (see solve_tsp).
+    """
+    if mode == 'cluster':
+        options = {k: v for k, v in solve_options.items() if k != 'solution_limit'}
+        return solve_clustered((lats[0], lngs[0]), lats[1:], lngs[1:], matrix_for=matrix_for,
+                               workers=processes, **route_params, **options)
+    if route_params.get('portfolio'):
+        options = {k: v for k, v in solve_options.items() if k not in ('metaheuristic', 'first_solution')}
+        return solve_portfolio(matrix_for(lats, lngs), route_params['portfolio'], workers=processes,
+                               **options)
+    if route_params.get('neighbors'):
+        # Sparse k-nearest-neighbour arc set: O(N·k) memory, no dense matrix
+        # It always starts from its Hilbert-curve tour, so first_solution does not apply
+        options = {k: v for k, v in solve_options.items() if k != 'first_solution'}
+        return solve_tsp_sparse(lats, lngs, k=route_params['neighbors'],
+                                on_improvement=on_improvement, **options)
+    return solve_tsp(matrix_for(lats, lngs), on_improvement=on_improvement, **solve_options)
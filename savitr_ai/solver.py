@@ -0,0 +1,196 @@
+import time
+
+import numpy as np
+from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+
+# Upper bound on a solve when the caller gives no budget
+DEFAULT_TIME_LIMIT_MS = 30000
+# Stop once the best objective has not improved for this long
+DEFAULT_NO_IMPROVEMENT_MS = 2000
+# Sizes (including the depot) at which choose_metaheuristic switches strategy
+SMALL_PROBLEM_SIZE = 25
+LARGE_PROBLEM_SIZE = 3000
+METAHEURISTICS = ('GREEDY_DESCENT', 'GUIDED_LOCAL_SEARCH', 'SIMULATED_ANNEALING', 'TABU_SEARCH')
+DEFAULT_FIRST_SOLUTION = 'PATH_CHEAPEST_ARC'
+FIRST_SOLUTION_STRATEGIES = ('PATH_CHEAPEST_ARC', 'SAVINGS', 'CHRISTOFIDES',
+                             'PARALLEL_CHEAPEST_INSERTION', 'LOCAL_CHEAPEST_INSERTION')
+
+
+def cost_matrix_meters(distance_matrix):
+    """Convert a km distance matrix to the integer-meter costs OR-Tools works with."""
+    # Truncate rather than round, matching the int(... * 1000) the callback used.
+    return (np.asarray(distance_matrix, dtype=np.float64) * 1000).astype(np.int64)
+
+
+def register_transit(routing, manager, cost_matrix, transit='matrix'):
+    """Register arc costs with the routing model and return the transit callback index.
+
+    'matrix' hands the whole cost table to OR-Tools, so evaluations during local
+    search stay in C++. 'callback' keeps the old per-arc Python callback and is
+    only kept around for benchmarking against it.
+    """
+    if transit == 'matrix':
+        return routing.RegisterTransitMatrix(cost_matrix.tolist())
+
+    def distance_callback(from_index, to_index):
+        from_node = manager.IndexToNode(from_index)
+        to_node = manager.IndexToNode(to_index)
+        return int(cost_matrix[from_node][to_node])
+
+    return routing.RegisterTransitCallback(distance_callback)
+
+
+def choose_metaheuristic(num_locations):
+    """Pick a local-search metaheuristic suited to the problem size.
+
+    Tiny tours are solved to a local optimum by greedy descent in milliseconds;
+    guided local search pays off on mid-sized tours; on very large ones each GLS
+    move is too expensive, so we settle for the descent.
+    """
+    if num_locations <= SMALL_PROBLEM_SIZE or num_locations > LARGE_PROBLEM_SIZE:
+        return 'GREEDY_DESCENT'
+    return 'GUIDED_LOCAL_SEARCH'
+
+
+def search_parameters_for(num_locations, time_limit_ms=None, solution_limit=None,
+                          metaheuristic=None, log_search=False, first_solution=None):
+    """Build routing search parameters; returns (parameters, metaheuristic name)."""
+    metaheuristic = metaheuristic or choose_metaheuristic(num_locations)
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy, first_solution or DEFAULT_FIRST_SOLUTION)
+    search_parameters.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic)
+    search_parameters.time_limit.FromMilliseconds(int(time_limit_ms or DEFAULT_TIME_LIMIT_MS))
+    if solution_limit:
+        search_parameters.solution_limit = int(solution_limit)
+    search_parameters.log_search = log_search
+    return search_parameters, metaheuristic
+
+
+def add_no_improvement_stop(routing, no_improvement_ms, on_improvement=None):
+    """Finish the search once no better objective has been found for `no_improvement_ms`.
+
+    `on_improvement(objective)` is called from inside the search each time the
+    best objective improves. Returns a dict the callback keeps up to date (best
+    objective, solution count).
+    """
+    progress = {'best': None, 'solutions': 0, 'improved_at': time.monotonic()}
+    limit_s = no_improvement_ms / 1000.0 if no_improvement_ms else None
+
+    def on_solution():
+        progress['solutions'] += 1
+        objective = routing.CostVar().Value()
+        now = time.monotonic()
+        if progress['best'] is None or objective < progress['best']:
+            progress['best'] = objective
+            progress['improved_at'] = now
+            if on_improvement is not None:
+                on_improvement(objective)
+        elif limit_s is not None and now - progress['improved_at'] >= limit_s:
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(on_solution)
+    return progress
+
+
+def solve_tsp(distance_matrix, time_limit_ms=None, solution_limit=None,
+              no_improvement_ms=DEFAULT_NO_IMPROVEMENT_MS, metaheuristic=None,
+              transit='matrix', log_search=False, initial_route=None, on_improvement=None,
+              first_solution=None):
+    """Solve the Traveling Salesman Problem using OR-Tools.
+
+    `initial_route` (a full tour with the depot at both ends, as returned here)
+    warm-starts local search from that tour instead of building a first solution
+    with `first_solution` (default PATH_CHEAPEST_ARC).
+    `on_improvement(objective, snapshot)` is called whenever the search finds a
+    better tour; `snapshot()` returns that tour while the callback runs.
+
+    Returns (route, total_distance_km, stats); route and distance are None when
+    no solution was found. stats carries the integer objective, wall-clock solve
+    time and the metaheuristic that was used.
+    """
+    num_locations = len(distance_matrix)
+    started = time.perf_counter()
+
+    # Create routing model
+    manager = pywrapcp.RoutingIndexManager(num_locations, 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_callback_index = register_transit(
+        routing, manager, cost_matrix_meters(distance_matrix), transit)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    search_parameters, metaheuristic = search_parameters_for(
+        num_locations, time_limit_ms, solution_limit, metaheuristic, log_search, first_solution)
+    progress = add_no_improvement_stop(
+        routing, no_improvement_ms, improvement_reporter(routing, manager, on_improvement))
+
+    setup_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    # Solve the problem
+    if initial_route is not None:
+        routing.CloseModelWithParameters(search_parameters)
+        hint = routing.ReadAssignmentFromRoutes([[int(node) for node in initial_route[1:-1]]], True)
+        solution = routing.SolveFromAssignmentWithParameters(hint, search_parameters)
+    else:
+        solution = routing.SolveWithParameters(search_parameters)
+
+    stats = {
+        'objective': solution.ObjectiveValue() if solution else None,
+        'solve_time_ms': round((time.perf_counter() - started) * 1000, 2),
+        'setup_ms': setup_ms,
+        'metaheuristic': metaheuristic,
+        'first_solution': first_solution or DEFAULT_FIRST_SOLUTION,
+        'solutions': progress['solutions'],
+    }
+    if not solution:
+        return None, None, stats
+
+    route = extract_route(routing, manager, solution)
+
+    # Calculate total distance
+    total_distance = solution.ObjectiveValue() / 1000.0  # Convert back to kilometers
+
+    return route, total_distance, stats
+
+
+def improvement_reporter(routing, manager, on_improvement):
+    """Adapt an on_improvement(objective, snapshot) hook to add_no_improvement_stop."""
+    if on_improvement is None:
+        return None
+    return lambda objective: on_improvement(objective, lambda: current_route(routing, manager))
+
+
+def insert_cheapest(route, nodes, distance_matrix):
+    """Insert each of `nodes` into a closed tour where it lengthens it least."""
+    tour = list(route)
+    for node in nodes:
+        stops = np.asarray(tour)
+        added = (distance_matrix[stops[:-1], node] + distance_matrix[node, stops[1:]]
+                 - distance_matrix[stops[:-1], stops[1:]])
+        tour.insert(int(np.argmin(added)) + 1, int(node))
+    return tour
+
+
+def extract_route(routing, manager, solution, vehicle=0):
+    """Read a vehicle's node sequence out of a solution, depot at both ends."""
+    route = []
+    index = routing.Start(vehicle)
+    while not routing.IsEnd(index):
+        route.append(manager.IndexToNode(index))
+        index = solution.Value(routing.NextVar(index))
+    route.append(manager.IndexToNode(index))  # Add the depot at the end to complete the loop
+    return route
+
+
+def current_route(routing, manager, vehicle=0):
+    """Node sequence of the solution being reported; only valid inside a solution callback."""
+    route = []
+    index = routing.Start(vehicle)
+    while not routing.IsEnd(index):
+        route.append(manager.IndexToNode(index))
+        index = routing.NextVar(index).Value()
+    route.append(manager.IndexToNode(index))
+    return route
@@ -0,0 +1,155 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Solves allowed to wait for a free worker, per worker, before callers get a 429
+DEFAULT_QUEUE_PER_WORKER = 2
+# Assumed solve time until the pool has measured some
+DEFAULT_SOLVE_SECONDS = 2.0
+
+
+class PoolBusy(Exception):
+    """Raised when the solver queue is full; `retry_after` is a whole number of seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Solver queue is full, retry in {retry_after} s")
+        self.retry_after = retry_after
+
+
+class SharedArray:
+    """Picklable handle to a NumPy array in shared memory; workers map it instead of unpickling it."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self):
+        """Map the block in this process; returns (SharedMemory, ndarray view)."""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers the attach; spawned workers share
+            # the parent's resource tracker, so that is a no-op re-registration
+            # and the parent's unlink still clears it
+            shm = shared_memory.SharedMemory(name=self.name)
+        return shm, np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+
+@contextmanager
+def share_array(array):
+    """Copy `array` into a new shared-memory block for the duration of the block."""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    try:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        yield SharedArray(shm.name, array.shape, array.dtype.str)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _run(fn, args, kwargs):
+    """Worker: map SharedArray arguments, call fn, and release the mappings."""
+    blocks = []
+    resolved = []
+    try:
+        for arg in args:
+            if isinstance(arg, SharedArray):
+                shm, arg = arg.attach()
+                blocks.append(shm)
+            resolved.append(arg)
+        return fn(*resolved, **kwargs)
+    finally:
+        resolved = arg = None
+        for shm in blocks:
+            shm.close()
+
+
+class SolverPool:
+    """Runs blocking solves in a process pool, one OR-Tools search per core.
+
+    `run` blocks the calling request thread until its solve is done, so with a
+    threaded gunicorn worker independent /api/route requests are solved in
+    parallel. At most `max_workers + max_queue` solves are admitted at once;
+    beyond that `run` raises PoolBusy with a retry hint based on recent solve
+    times.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if max_queue is None:
+            max_queue = DEFAULT_QUEUE_PER_WORKER * self.max_workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._in_flight = 0
+        self._avg_seconds = DEFAULT_SOLVE_SECONDS
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the web worker has threads and OR-Tools state
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up."""
+        waves = math.ceil((self._in_flight + 1) / self.max_workers)
+        return max(1, math.ceil(waves * self._avg_seconds))
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) in a worker and return its result; raises PoolBusy."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy(self.retry_after())
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            pool = self._executor()
+            try:
+                return pool.submit(_run, fn, args, kwargs).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); replace the pool for later solves
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def stats(self):
+        return {'workers': self.max_workers, 'in_flight': self._in_flight,
+                'queue': self.max_queue, 'avg_solve_s': round(self._avg_seconds, 3)}
+
+
+def solver_pool_from_env():
+    """SolverPool sized by SOLVER_WORKERS / SOLVER_QUEUE; None when SOLVER_WORKERS=0."""
+    workers = int(os.environ.get('SOLVER_WORKERS', os.cpu_count() or 1))
+    if workers <= 0:
+        return None
+    queue = os.environ.get('SOLVER_QUEUE')
+    return SolverPool(max_workers=workers, max_queue=int(queue) if queue is not None else None)
@@ -0,0 +1,44 @@
+"""How the web app starts: what it imports up front and when its models are warmed.
+
+STARTUP_MODE=eager (the default) imports everything and loads and warms the
+models when app.py is imported, as it always has. STARTUP_MODE=lazy, which
+gunicorn.conf.py sets, leaves the routing stack (OR-Tools, scipy) to the first
+request that needs it and leaves the warm-up to the server: gunicorn runs it
+in the master before forking, so workers share the loaded models copy-on-write.
+/health answers 503 until the warm-up has finished.
+"""
+import importlib
+import os
+
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager').lower()
+STARTUP_MODES = ('eager', 'lazy')
+if STARTUP_MODE not in STARTUP_MODES:
+    raise ValueError(f"STARTUP_MODE must be one of: {', '.join(STARTUP_MODES)}")
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    importlib's module locks make concurrent first accesses from request
+    threads safe; all of them get the one module object.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{'' if self._module is None else ' (imported)'}>"
+
+
+def lazy_import(name):
+    """The module `name`: imported now in eager mode, on first use in lazy mode."""
+    if STARTUP_MODE == 'lazy':
+        return LazyModule(name)
+    return importlib.import_module(name)
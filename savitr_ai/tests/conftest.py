@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Solve in the test process, on straight-line costs, whatever the shell has set
+os.environ['SOLVER_WORKERS'] = '0'
+os.environ.pop('ROAD_NETWORK_PATH', None)
+
+DEPOT = {'lat': 22.5726, 'lng': 88.3639}
+
+
+def deliveries(n, seed=7):
+    """n delivery points scattered a few km around DEPOT."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    offsets = rng.uniform(-0.05, 0.05, size=(n, 2))
+    return [{'lat': DEPOT['lat'] + float(dlat), 'lng': DEPOT['lng'] + float(dlng)}
+            for dlat, dlng in offsets]
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
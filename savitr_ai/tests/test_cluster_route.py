@@ -0,0 +1,20 @@
+from clustering import chained_route
+from conftest import DEPOT, deliveries
+
+
+def test_chained_route_drops_the_depot_returns():
+    assert chained_route([0, 3, 1, 0, 2, 5, 0, 4, 0]) == [0, 3, 1, 2, 5, 4, 0]
+
+
+def test_cluster_response_counts_depot_returns_apart_from_points(client):
+    response = client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': deliveries(40), 'mode': 'cluster',
+        'max_cluster_size': 10, 'time_limit_ms': 600, 'cache': False})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['clusters'] >= 4
+    assert body['depot_returns'] == body['clusters'] - 1
+    assert body['route'][1:-1].count(0) == body['depot_returns']
+    # The depot at both ends plus every delivery, as for a tsp response
+    assert body['total_points'] == 40 + 2
+    assert len(body['ordered_deliveries']) == 40
@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+import compact_models
+from conftest import APP_DIR
+
+POST_CSV = os.path.join(APP_DIR, 'Post.csv')
+
+
+@pytest.mark.parametrize('name', sorted(compact_models.EXPORTABLE))
+def test_deployed_export_matches_its_pickle(name):
+    # Checks the committed arrays as they are; nothing is re-exported
+    source = os.path.join(compact_models.MODELS_DIR, compact_models.EXPORTABLE[name])
+    model = compact_models.load(compact_models.compact_path(name))
+    assert model.source_sha256 == compact_models.file_digest(source)
+    assert compact_models.verify(POST_CSV, names=[name]) == {name: 0}
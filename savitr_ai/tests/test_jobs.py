@@ -0,0 +1,48 @@
+import pytest
+
+from jobs import DONE, FAILED, FINISHED, JobQueue
+
+ROUTE = [0, 2, 1, 0]
+
+
+def improving_solve(steps, on_improvement=None):
+    """Report `steps` improvements back to back, well inside the progress interval."""
+    for objective in range(steps, 0, -1):
+        on_improvement(objective * 1000, lambda: ROUTE)
+    return ROUTE, 1.0, {'objective': 1000}
+
+
+def failing_solve(on_improvement=None):
+    raise ValueError('no tour')
+
+
+@pytest.fixture
+def job_queue():
+    queue = JobQueue(max_workers=1)
+    yield queue
+    if queue._pool is not None:
+        queue._pool.shutdown()
+
+
+def finished(queue, job_id):
+    job = queue.get(job_id)
+    while job['status'] not in FINISHED:
+        job = queue.wait(job_id, len(job['progress']), timeout=30)
+    return job
+
+
+def test_last_improvement_is_reported_before_done(job_queue):
+    job = finished(job_queue, job_queue.submit(improving_solve, 5))
+    assert job['status'] == DONE
+    # The first improvement goes out at once, the other four fall in its throttle window
+    assert [event['objective'] for event in job['progress']] == [5000, 1000]
+    assert job['best']['objective'] == 1000
+    assert job['best']['route'] == ROUTE
+    assert job['result'][0] == ROUTE
+
+
+def test_failed_job_keeps_its_error(job_queue):
+    job = finished(job_queue, job_queue.submit(failing_solve))
+    assert job['status'] == FAILED
+    assert job['error'] == 'no tour'
+    assert job['result'] is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from clustering import solve_clustered
+from conftest import DEPOT, deliveries
+from distance import haversine_matrix, location_coordinates
+
+
+class DetourCosts:
+    """Stand-in road network: every leg is half again its straight-line length."""
+
+    path = 'detour.npz'
+    key = 'road:detour'
+
+    def matrix(self, lats, lngs):
+        return haversine_matrix(lats, lngs) * 1.5
+
+    def travel_minutes(self, lats, lngs):
+        return None
+
+
+def tour_km(costs, locations, route):
+    lats, lngs = location_coordinates(locations)
+    matrix = costs.matrix(lats, lngs)
+    return float(sum(matrix[a, b] for a, b in zip(route, route[1:])))
+
+
+def test_clusters_are_priced_by_the_cost_provider():
+    locations = [DEPOT] + deliveries(60)
+    lats, lngs = location_coordinates(locations)
+    costs = DetourCosts()
+    route, total_distance, stats = solve_clustered(
+        (lats[0], lngs[0]), lats[1:], lngs[1:], max_cluster_size=20, workers=1,
+        time_limit_ms=600, matrix_for=costs.matrix)
+    assert stats['clusters'] >= 3
+    assert sorted(set(route)) == list(range(len(locations)))
+    # Arcs are priced in whole metres, so allow for rounding
+    assert total_distance == pytest.approx(tour_km(costs, locations, route), rel=1e-3)
+
+
+def test_cluster_route_uses_the_configured_road_network(app_module, client, monkeypatch):
+    costs = DetourCosts()
+    monkeypatch.setattr(app_module, 'cost_provider', costs)
+    locations = [DEPOT] + deliveries(40)
+    response = client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': locations[1:], 'mode': 'cluster',
+        'max_cluster_size': 15, 'time_limit_ms': 600, 'cache': False})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total_distance'] == pytest.approx(tour_km(costs, locations, body['route']), rel=1e-3)
+
+
+def test_neighbors_is_refused_with_a_road_network(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'cost_provider', DetourCosts())
+    response = client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': deliveries(20), 'neighbors': 8})
+    assert response.status_code == 400
+    assert 'road network' in response.get_json()['message']
+
+
+def test_neighbors_is_solved_on_straight_line_costs(client):
+    locations = [DEPOT] + deliveries(20)
+    response = client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': locations[1:], 'neighbors': 8,
+        'time_limit_ms': 500, 'cache': False})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert np.isfinite(body['total_distance'])
+    assert sorted(body['route'][:-1]) == list(range(len(locations)))
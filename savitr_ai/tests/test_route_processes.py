@@ -0,0 +1,41 @@
+import pytest
+
+import clustering
+import portfolio
+from conftest import DEPOT, deliveries
+from distance import haversine_matrix, location_coordinates
+
+
+class NoProcesses:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError('a process pool was started')
+
+
+@pytest.fixture
+def single_process(app_module, monkeypatch):
+    """The app as asgi's route workers run it, with process pools made to fail."""
+    monkeypatch.setattr(app_module, 'SOLVE_PROCESSES', 1)
+    monkeypatch.setattr(clustering, 'ProcessPoolExecutor', NoProcesses)
+    monkeypatch.setattr(portfolio, 'SolverPool', NoProcesses)
+
+
+def test_portfolio_members_take_turns_without_a_pool():
+    lats, lngs = location_coordinates([DEPOT] + deliveries(15))
+    strategies = portfolio.DEFAULT_PORTFOLIO[:2]
+    route, total_distance, stats = portfolio.solve_portfolio(
+        haversine_matrix(lats, lngs), strategies, time_limit_ms=400, workers=1)
+    assert sorted(route[:-1]) == list(range(16))
+    assert [member.get('skipped') for member in stats['portfolio']] == [None, None]
+
+
+@pytest.mark.usefixtures('single_process')
+@pytest.mark.parametrize('options', [
+    {'mode': 'cluster', 'max_cluster_size': 10},
+    {'portfolio': ['PATH_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH', 'SAVINGS/GUIDED_LOCAL_SEARCH']},
+])
+def test_route_requests_stay_in_one_process(client, options):
+    response = client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': deliveries(30), 'time_limit_ms': 400, 'cache': False,
+        **options})
+    assert response.status_code == 200
+    assert sorted(set(response.get_json()['route'])) == list(range(31))
@@ -0,0 +1,61 @@
+import pytest
+
+import vrp
+from conftest import DEPOT, deliveries
+
+
+def fleet_request(client, stops=None, **body):
+    stops = stops or deliveries(6)
+    return client.post('/api/route', json={
+        'source_point': DEPOT, 'deliveries': stops, 'mode': 'vrp', 'time_limit_ms': 500, **body})
+
+
+@pytest.mark.parametrize('value, minutes', [
+    ('10:00 AM', 600), ('12:00 PM', 720), ('12:30 AM', 30), ('03:00 PM', 900), ('15:30', 930),
+    ('0:00', 0), ('23:59', 1439), (540, 540),
+])
+def test_parse_clock(value, minutes):
+    assert vrp.parse_clock(value) == minutes
+
+
+@pytest.mark.parametrize('value', ['25:00', '24:00', '10:60', '13:00 PM', 'noon', -1, 1440])
+def test_parse_clock_rejects_times_outside_the_day(value):
+    with pytest.raises(ValueError):
+        vrp.parse_clock(value)
+
+
+@pytest.mark.parametrize('slot', ['12:00 PM - 10:00 AM', '10:00 - 10:00'])
+def test_parse_slot_rejects_empty_windows(slot):
+    with pytest.raises(ValueError):
+        vrp.parse_slot(slot)
+
+
+@pytest.mark.parametrize('window', ['25:00 - 26:00', '10:75 - 11:00', '12:00 PM - 10:00 AM', [1500, 1600]])
+def test_out_of_range_time_window_is_a_bad_request(client, window):
+    stops = deliveries(6)
+    stops[2]['time_window'] = window
+    response = fleet_request(client, stops)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid fleet request'
+
+
+def test_out_of_range_shift_is_a_bad_request(client):
+    assert fleet_request(client, shift='25:00 - 26:00').status_code == 400
+
+
+@pytest.mark.parametrize('count', [0, -2])
+def test_vehicle_count_below_one_is_a_bad_request(client, count):
+    response = fleet_request(client, vehicle_count=count)
+    assert response.status_code == 400
+    assert 'vehicle_count' in response.get_json()['message']
+
+
+def test_missing_vehicle_count_means_one_vehicle(client):
+    stops = deliveries(6)
+    for stop in stops:
+        stop['time_window'] = '10:00 AM - 12:00 PM'
+    response = fleet_request(client, stops)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['routes']) == 1
+    assert body['dropped_deliveries'] == []
@@ -0,0 +1,225 @@
+"""Train, cross-validate and version the slot-prediction models.
+
+The shared ColumnTransformer is fitted once and the transformed feature
+matrix is cached on disk with joblib.Memory (keyed by the CSV's path, size
+and mtime), so re-running with other models or folds skips the preprocessing.
+Every cross-validation fold and every final fit of every model is one task
+in a single joblib.Parallel run; the feature matrix is memory-mapped into the
+workers rather than copied.
+
+Artifacts land in saved_models/versions/<version>/ (the four *_pipeline.pkl
+files, encoders.pkl, the user feature store and metrics.json). --promote copies them over the served
+files in saved_models/ and re-exports the compact format, which running
+workers pick up on their next request.
+
+    python train.py --data Post.csv --n-jobs -1 --promote
+
+Histories too large for memory can be trained with --stream (see
+train_stream.py): logistic regression becomes an SGD fit and XGBoost uses
+external memory, and the KNN and random forest pipelines are left as they are.
+
+The preprocessor is fitted on the whole history before cross-validation, so
+its imputation and scaling statistics are shared by the folds. With a handful
+of numeric columns and fixed vocabularies this barely moves the scores, and it
+is what makes fitting it once possible.
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from joblib import Memory, Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+import compact_models
+import train_stream
+import user_features
+from ml_models import (TARGET, build_models, build_preprocessor, build_target_encoder, load_history,
+                       pipeline_filename, time_slots)
+from model_registry import ENCODERS_FILE, MODELS_DIR
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = os.path.join(MODELS_DIR, 'versions')
+CACHE_DIR = os.path.join(MODELS_DIR, '.cache')
+METRICS_FILE = 'metrics.json'
+DEFAULT_FOLDS = 5
+# Rows used for cross-validation scores; final models always fit on everything.
+# KNN scoring is quadratic-ish in rows, so scoring all of a 1M-row export is hours.
+DEFAULT_CV_ROWS = 200_000
+
+
+def _transform(path, size, mtime):
+    # size and mtime are only part of the cache key
+    data = load_history(path)
+    data = data[data[TARGET].notna()]
+    preprocessor = build_preprocessor()
+    X = preprocessor.fit_transform(data)
+    if hasattr(X, 'toarray'):
+        X = X.toarray()
+    y_encoder = build_target_encoder()
+    y = y_encoder.fit_transform(data[[TARGET]]).ravel()
+    return preprocessor, y_encoder, user_features.build(data), np.ascontiguousarray(X, dtype=np.float64), y
+
+
+def transformed(path, cache_dir=CACHE_DIR):
+    """(fitted preprocessor, fitted target encoder, user feature store, X, y) for a history CSV,
+    cached on disk."""
+    stat = os.stat(path)
+    memory = Memory(cache_dir, verbose=0)
+    return memory.cache(_transform)(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _score_fold(name, estimator, X, y, train, test):
+    started = time.perf_counter()
+    model = clone(estimator).fit(X[train], y[train])
+    predicted = model.predict(X[test])
+    return name, {
+        'accuracy': accuracy_score(y[test], predicted),
+        'f1_macro': f1_score(y[test], predicted, average='macro'),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _fit(name, estimator, X, y):
+    started = time.perf_counter()
+    return name, clone(estimator).fit(X, y), time.perf_counter() - started
+
+
+def train(X, y, models, folds=DEFAULT_FOLDS, cv_rows=DEFAULT_CV_ROWS, n_jobs=-1, seed=42):
+    """Cross-validate and fit every model; returns ({name: fitted}, {name: metrics})."""
+    tasks = [delayed(_fit)(name, estimator, X, y) for name, estimator in models.items()]
+    if folds > 1:
+        rows = np.arange(len(y))
+        if cv_rows and len(rows) > cv_rows:
+            rows = np.sort(np.random.default_rng(seed).choice(rows, cv_rows, replace=False))
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+        for train_idx, test_idx in splitter.split(rows, y[rows]):
+            tasks += [delayed(_score_fold)(name, estimator, X, y, rows[train_idx], rows[test_idx])
+                      for name, estimator in models.items()]
+
+    results = Parallel(n_jobs=n_jobs)(tasks)
+    fitted, report = {}, {name: {'folds': []} for name in models}
+    for result in results:
+        if len(result) == 3:
+            name, model, seconds = result
+            fitted[name] = model
+            report[name]['fit_seconds'] = round(seconds, 3)
+        else:
+            name, scores = result
+            report[name]['folds'].append(scores)
+    for name, entry in report.items():
+        folds_scores = entry.pop('folds')
+        for metric in ('accuracy', 'f1_macro'):
+            values = [s[metric] for s in folds_scores]
+            if values:
+                entry[f'cv_{metric}'] = round(float(np.mean(values)), 4)
+                entry[f'cv_{metric}_std'] = round(float(np.std(values)), 4)
+    return fitted, report
+
+
+def write_version(version_dir, preprocessor, y_encoder, store, fitted, report):
+    """Write the served artifacts for one training run into `version_dir`."""
+    os.makedirs(version_dir, exist_ok=True)
+    # The user_id_encoded lookup the models were trained with
+    user_features.save(store, os.path.join(version_dir, 'user_features'))
+    for name, classifier in fitted.items():
+        pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', classifier)])
+        with open(os.path.join(version_dir, pipeline_filename(name)), 'wb') as file:
+            pickle.dump(pipeline, file)
+    with open(os.path.join(version_dir, ENCODERS_FILE), 'wb') as file:
+        pickle.dump({'y_encoder': y_encoder, 'preprocessor': preprocessor, 'time_slots': time_slots}, file)
+    with open(os.path.join(version_dir, METRICS_FILE), 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def promote(version_dir, models_dir=MODELS_DIR):
+    """Copy a version's artifacts over the served ones and refresh the compact export."""
+    for filename in sorted(os.listdir(version_dir)):
+        if filename.endswith('.pkl'):
+            tmp = os.path.join(models_dir, filename + '.tmp')
+            shutil.copyfile(os.path.join(version_dir, filename), tmp)
+            # Atomic swap: ModelRegistry never sees a half-written pickle
+            os.replace(tmp, os.path.join(models_dir, filename))
+    store_dir = os.path.join(version_dir, 'user_features')
+    user_features.save(user_features.load(store_dir), os.path.join(models_dir, 'user_features'))
+    compact_models.export(models_dir, os.path.join(models_dir, 'compact'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and cross-validate the slot-prediction models.')
+    parser.add_argument('--data', default='Post.csv', help='order history CSV (Post.csv layout)')
+    parser.add_argument('--models', nargs='+', choices=sorted(build_models()),
+                        help='subset of models to train (default: all)')
+    parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS, help='CV folds (0 or 1 skips CV)')
+    parser.add_argument('--cv-rows', type=int, default=DEFAULT_CV_ROWS,
+                        help='rows sampled for CV scores (0 = all)')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--version', help='artifact version (default: UTC timestamp)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--promote', action='store_true',
+                        help='also replace the served models in saved_models/')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the CSV in chunks and train only the incremental models')
+    parser.add_argument('--chunk-rows', type=int, default=train_stream.DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--epochs', type=int, default=train_stream.DEFAULT_EPOCHS,
+                        help='passes of the SGD logistic regression over the history (--stream)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    version = args.version or datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(VERSIONS_DIR, version)
+
+    if args.stream:
+        started = time.perf_counter()
+        preprocessor, y_encoder, store, fitted, report = train_stream.stream_train(
+            args.data, args.models or train_stream.STREAMING_MODELS, args.chunk_rows,
+            epochs=args.epochs)
+        report.update(version=version, data=os.path.abspath(args.data), mode='stream',
+                      train_seconds=round(time.perf_counter() - started, 3))
+        write_version(version_dir, preprocessor, y_encoder, store, fitted, report)
+        finish(version, version_dir, report['models'], args.promote)
+        return
+
+    started = time.perf_counter()
+    preprocessor, y_encoder, store, X, y = transformed(args.data, args.cache_dir)
+    prepared = time.perf_counter()
+    logger.info(f"Features ready: {X.shape[0]} rows x {X.shape[1]} in {prepared - started:.1f} s")
+
+    models = build_models()
+    if args.models:
+        models = {name: models[name] for name in args.models}
+    fitted, report = train(X, y, models, args.folds, args.cv_rows, args.n_jobs)
+
+    write_version(version_dir, preprocessor, y_encoder, store, fitted, {
+        'version': version,
+        'data': os.path.abspath(args.data),
+        'rows': int(X.shape[0]),
+        'features': int(X.shape[1]),
+        'folds': args.folds,
+        'cv_rows': min(args.cv_rows or X.shape[0], X.shape[0]),
+        'preprocess_seconds': round(prepared - started, 3),
+        'train_seconds': round(time.perf_counter() - prepared, 3),
+        'models': report,
+    })
+    finish(version, version_dir, report, args.promote)
+
+
+def finish(version, version_dir, report, promote_version):
+    for name, entry in report.items():
+        logger.info(f"{name}: {json.dumps(entry)}")
+    logger.info(f"Wrote {version_dir}")
+    if promote_version:
+        promote(version_dir)
+        logger.info(f"Promoted {version} to {MODELS_DIR}")
+
+
+if __name__ == '__main__':
+    main()
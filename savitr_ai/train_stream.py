@@ -0,0 +1,233 @@
+"""Streaming training for order histories too large to load at once (`train.py --stream`).
+
+The CSV is read in chunks, so memory stays flat in the number of rows:
+
+1. A scan pass accumulates the per-user slot counts and last order dates
+   (the user feature store behind user_id_encoded), the one-hot vocabularies, the class counts and a fixed-size uniform
+   reservoir sample of rows.
+2. The preprocessor is fitted on the reservoir, with its one-hot
+   vocabularies fixed to everything the scan saw.
+3. Training passes feed transformed chunks to an SGD logistic regression
+   (partial_fit) and to XGBoost through an external-memory DMatrix, whose
+   quantile pages are cached on disk instead of in memory.
+4. An evaluation pass scores both on the held-out rows (every
+   `holdout_every`-th row of the file, never trained on).
+
+What does grow is the per-user state, one entry per distinct user.
+"""
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.linear_model import SGDClassifier
+
+import user_features
+
+from ml_models import (INPUT_COLUMNS, TARGET, add_features, build_models, build_preprocessor,
+                       build_target_encoder, categorical_features, time_slots, user_slot_modes)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 100_000
+# Rows the preprocessor's imputation/scaling statistics are estimated from
+DEFAULT_SAMPLE_ROWS = 100_000
+DEFAULT_EPOCHS = 3
+# Every n-th row of the file is held out for the evaluation pass
+HOLDOUT_EVERY = 10
+# Models with an incremental fit; the other two need the whole matrix in memory
+STREAMING_MODELS = ('Logistic Regression', 'XGBoost')
+# One-hot columns whose vocabulary comes from the raw data (user_id_encoded's is the slots)
+VOCAB_COLUMNS = [col for col in categorical_features if col != 'user_id_encoded']
+
+
+def read_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield (chunk, holdout mask) for the labelled rows of a history CSV."""
+    for chunk in pd.read_csv(path, usecols=INPUT_COLUMNS, chunksize=chunk_rows):
+        # The chunk index is the row number in the file, so the split is stable across passes
+        holdout = chunk.index.to_numpy() % HOLDOUT_EVERY == 0
+        labelled = chunk[TARGET].notna().to_numpy()
+        yield chunk[labelled], holdout[labelled]
+
+
+class HistoryScan:
+    """Everything the first pass over the history accumulates."""
+
+    def __init__(self, sample_rows=DEFAULT_SAMPLE_ROWS, seed=42):
+        self.rows = 0
+        self.user_slot_counts = None
+        self.last_order = None
+        self.class_counts = pd.Series(dtype=np.int64)
+        self.vocab = {col: set() for col in VOCAB_COLUMNS}
+        self.sample_rows = sample_rows
+        self.sample = None
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        counts = chunk.groupby(['User ID', TARGET]).size()
+        if self.user_slot_counts is not None:
+            counts = self.user_slot_counts.add(counts, fill_value=0)
+        self.user_slot_counts = counts
+        dates = pd.to_datetime(chunk[user_features.ORDER_DATE], format=user_features.ORDER_DATE_FORMAT,
+                               errors='coerce').groupby(chunk['User ID']).max()
+        if self.last_order is not None:
+            dates = pd.concat([self.last_order, dates]).groupby(level=0).max()
+        self.last_order = dates
+        self.class_counts = self.class_counts.add(chunk[TARGET].value_counts(), fill_value=0)
+        for col, values in self.vocab.items():
+            values.update(chunk[col].dropna().unique())
+        # Reservoir sample: keep the rows with the smallest random keys seen so far
+        keyed = chunk.assign(_key=self._rng.random(len(chunk)))
+        if self.sample is not None:
+            keyed = pd.concat([self.sample, keyed])
+        self.sample = keyed.nsmallest(self.sample_rows, '_key')
+
+    def user_id_mapping(self):
+        return user_slot_modes(self.user_slot_counts)
+
+    def user_features(self):
+        return user_features.from_counts(self.user_slot_counts, self.last_order)
+
+    def categories(self, user_id_mapping):
+        """One-hot vocabularies in categorical_features order, sorted as OneHotEncoder sorts them."""
+        vocab = dict(self.vocab, user_id_encoded=set(user_id_mapping.dropna()))
+        return [sorted(vocab[col]) for col in categorical_features]
+
+    def class_weight(self, y_encoder):
+        """'balanced' class weights (n / (k * count)), which partial_fit cannot compute itself."""
+        counts = self.class_counts.reindex(time_slots, fill_value=0)
+        codes = y_encoder.transform(np.asarray(time_slots).reshape(-1, 1)).ravel()
+        return {code: self.rows / (len(time_slots) * count)
+                for code, count in zip(codes, counts) if count}
+
+
+def scan_history(path, chunk_rows=DEFAULT_CHUNK_ROWS, sample_rows=DEFAULT_SAMPLE_ROWS):
+    scan = HistoryScan(sample_rows)
+    for chunk, _ in read_chunks(path, chunk_rows):
+        scan.add(chunk)
+    return scan
+
+
+def _transformed_chunks(path, preprocessor, y_encoder, user_id_mapping, chunk_rows, holdout):
+    """Yield (X, y) per chunk, for the held-out rows if `holdout` else for the training rows."""
+    for chunk, held_out in read_chunks(path, chunk_rows):
+        chunk = chunk[held_out if holdout else ~held_out].copy()
+        if len(chunk):
+            add_features(chunk, user_id_mapping)
+            y = y_encoder.transform(chunk[TARGET].to_numpy().reshape(-1, 1)).ravel()
+            yield preprocessor.transform(chunk), y
+
+
+class _ChunkIter(xgb.DataIter):
+    """Feeds transformed training chunks to an external-memory DMatrix."""
+
+    def __init__(self, chunks, cache_dir):
+        self._chunks = chunks
+        self._it = None
+        super().__init__(cache_prefix=os.path.join(cache_dir, 'xgb'))
+
+    def next(self, input_data):
+        if self._it is None:
+            self._it = self._chunks()
+        batch = next(self._it, None)
+        if batch is None:
+            return False
+        input_data(data=batch[0], label=batch[1])
+        return True
+
+    def reset(self):
+        self._it = None
+
+
+def _fit_sgd(chunks, class_weight, epochs, seed=42):
+    model = SGDClassifier(loss='log_loss', class_weight=class_weight, random_state=seed)
+    classes = np.arange(len(time_slots), dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for X, y in chunks():
+            order = rng.permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=classes)
+    return model
+
+
+def _fit_xgboost(chunks, template):
+    params = {k: v for k, v in template.get_xgb_params().items() if v is not None}
+    params['num_class'] = len(time_slots)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # ExtMemQuantileDMatrix is xgboost >= 3.0; DMatrix takes an iterator since 1.5
+        matrix_type = getattr(xgb, 'ExtMemQuantileDMatrix', xgb.DMatrix)
+        matrix = matrix_type(_ChunkIter(chunks, cache_dir))
+        booster = xgb.train(params, matrix, num_boost_round=template.n_estimators)
+    # Wrap in the sklearn estimator the served pipelines use
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(booster.save_raw('json')))
+    return model
+
+
+def _scores(confusion):
+    total = confusion.sum()
+    tp = np.diag(confusion)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f1 = 2 * tp / (confusion.sum(axis=0) + confusion.sum(axis=1))
+    return {
+        'holdout_accuracy': round(float(tp.sum() / total), 4) if total else None,
+        'holdout_f1_macro': round(float(np.nanmean(f1)), 4) if total else None,
+    }
+
+
+def stream_train(path, names=STREAMING_MODELS, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 sample_rows=DEFAULT_SAMPLE_ROWS, epochs=DEFAULT_EPOCHS):
+    """Train the streaming-capable models on a history CSV read in chunks.
+
+    Returns (preprocessor, y_encoder, user feature store, {name: fitted classifier},
+    report) for train.write_version.
+    """
+    started = time.perf_counter()
+    scan = scan_history(path, chunk_rows, sample_rows)
+    user_id_mapping = scan.user_id_mapping()
+    logger.info(f"Scanned {scan.rows} rows, {len(user_id_mapping)} users "
+                f"in {time.perf_counter() - started:.1f} s")
+
+    preprocessor = build_preprocessor(categories=scan.categories(user_id_mapping))
+    preprocessor.fit(add_features(scan.sample.drop(columns='_key'), user_id_mapping))
+    y_encoder = build_target_encoder().fit(np.asarray(time_slots).reshape(-1, 1))
+
+    def training_chunks():
+        return _transformed_chunks(path, preprocessor, y_encoder, user_id_mapping, chunk_rows, False)
+
+    templates = build_models()
+    fitted, report = {}, {}
+    for name in names:
+        fit_started = time.perf_counter()
+        if name == 'Logistic Regression':
+            fitted[name] = _fit_sgd(training_chunks, scan.class_weight(y_encoder), epochs)
+        elif name == 'XGBoost':
+            fitted[name] = _fit_xgboost(training_chunks, templates[name])
+        else:
+            raise ValueError(f"{name} has no streaming fit; choose from {', '.join(STREAMING_MODELS)}")
+        report[name] = {'fit_seconds': round(time.perf_counter() - fit_started, 3)}
+        logger.info(f"Fitted {name} in {report[name]['fit_seconds']} s")
+
+    k = len(time_slots)
+    confusion = {name: np.zeros((k, k), dtype=np.int64) for name in fitted}
+    for X, y in _transformed_chunks(path, preprocessor, y_encoder, user_id_mapping, chunk_rows, True):
+        for name, model in fitted.items():
+            predicted = np.asarray(model.predict(X), dtype=np.int64)
+            np.add.at(confusion[name], (y.astype(np.int64), predicted), 1)
+    for name in fitted:
+        report[name].update(_scores(confusion[name]))
+
+    return preprocessor, y_encoder, scan.user_features(), fitted, {
+        'rows': scan.rows,
+        'users': len(user_id_mapping),
+        'features': len(preprocessor.get_feature_names_out()),
+        'chunk_rows': chunk_rows,
+        'sample_rows': min(sample_rows, scan.rows),
+        'epochs': epochs,
+        'holdout_every': HOLDOUT_EVERY,
+        'models': report,
+    }
@@ -0,0 +1,124 @@
+"""Per-user features from the order history: modal slot, slot counts and recency.
+
+The model's user_id_encoded input is each user's most frequent delivery slot
+in the training history. The store keeps that, the per-slot order counts and
+the last order date, and is built by vectorized groupbys (no per-user Python).
+It is saved to saved_models/user_features/ as .npy arrays plus a meta.json,
+swapped in atomically like the compact models (see compact_models.save_arrays),
+and loaded once per process; lookups are dict hits. Users missing from the history
+(cold start) get NaN, which the pipeline's imputer fills with the most common
+slot, as it would for any order without a usable user history.
+
+    python user_features.py --data "Post(Post).csv"
+"""
+import argparse
+import json
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from compact_models import load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models')
+STORE_DIR = os.path.join(MODELS_DIR, 'user_features')
+META_FILE = 'meta.json'
+ORDER_DATE = 'order date (DateOrders)'
+ORDER_DATE_FORMAT = '%m/%d/%Y %H:%M'
+TARGET = 'Machine Prediction'
+
+
+class UserFeatures:
+    """Read-only per-user lookups over the stored arrays."""
+
+    def __init__(self, user_ids, slot_counts, last_order, slots):
+        self.slots = list(slots)
+        self.slot_counts = slot_counts
+        self.last_order = last_order
+        self._rows = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+        # Ties go to the first slot in sort order, like Series.mode()[0]
+        self._modal = dict(zip(self._rows, np.asarray(self.slots, dtype=object)[slot_counts.argmax(axis=1)]))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def modal_slot(self, user_id):
+        """The user's most frequent slot, or NaN for an unknown (cold-start) user."""
+        return self._modal.get(user_id, math.nan)
+
+    def modal_slots(self, user_ids):
+        """modal_slot for a Series of user IDs."""
+        return user_ids.map(self._modal)
+
+    def lookup(self, user_id):
+        """All stored features for one user, or None if the user has no history."""
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        last_order = self.last_order[row]
+        return {
+            'modal_slot': self._modal[user_id],
+            'orders': int(self.slot_counts[row].sum()),
+            'slot_counts': dict(zip(self.slots, self.slot_counts[row].tolist())),
+            'last_order': None if np.isnat(last_order) else str(last_order),
+        }
+
+
+def from_counts(counts, last_order=None):
+    """Build the store from (User ID, slot) -> order counts and optional User ID -> last order date."""
+    table = counts.unstack(fill_value=0).sort_index(axis=1)
+    if last_order is None:
+        dates = np.full(len(table), np.datetime64('NaT'), dtype='datetime64[s]')
+    else:
+        dates = last_order.reindex(table.index).to_numpy(dtype='datetime64[s]')
+    return UserFeatures(table.index.to_numpy(), table.to_numpy(dtype=np.int64), dates, table.columns)
+
+
+def build(history):
+    """Build the store from an order-history DataFrame (Post.csv layout)."""
+    history = history[history[TARGET].notna()]
+    counts = history.groupby(['User ID', TARGET]).size()
+    last_order = None
+    if ORDER_DATE in history:
+        dates = pd.to_datetime(history[ORDER_DATE], format=ORDER_DATE_FORMAT, errors='coerce')
+        last_order = dates.groupby(history['User ID']).max()
+    return from_counts(counts, last_order)
+
+
+def save(store, store_dir=STORE_DIR):
+    save_arrays(store_dir, {
+        'user_ids': np.asarray(list(store._rows)),
+        'slot_counts': store.slot_counts,
+        'last_order': store.last_order,
+    }, {'slots': store.slots, 'users': len(store)})
+
+
+def load(path=STORE_DIR):
+    """Load a store from its directory (or its meta.json)."""
+    store_dir = os.path.dirname(path) if path.endswith(META_FILE) else path
+    with open(os.path.join(store_dir, META_FILE)) as file:
+        meta = json.load(file)
+    # Stores from before version directories do not list their arrays
+    meta.setdefault('arrays', ['user_ids', 'slot_counts', 'last_order'])
+    arrays = load_arrays(store_dir, meta)
+    return UserFeatures(arrays['user_ids'], arrays['slot_counts'], arrays['last_order'], meta['slots'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the per-user feature store from an order history.')
+    parser.add_argument('--data', default='Post(Post).csv', help='order history CSV (Post.csv layout)')
+    parser.add_argument('--out', default=STORE_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = build(pd.read_csv(args.data, usecols=['User ID', ORDER_DATE, TARGET]))
+    save(store, args.out)
+    logger.info(f"Wrote features for {len(store)} users to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import re
+import time
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+from solver import (DEFAULT_NO_IMPROVEMENT_MS, add_no_improvement_stop, cost_matrix_meters,
+                    extract_route, search_parameters_for)
+
+# Riders' working day, in minutes after midnight
+DEFAULT_SHIFT = (9 * 60, 18 * 60)
+# Urban two-wheeler speed used to turn km into minutes
+DEFAULT_SPEED_KMPH = 20.0
+DEFAULT_SERVICE_MINUTES = 5
+# How long a rider may wait at a stop for its window to open
+MAX_WAIT_MINUTES = 120
+# Cost (in meters) of leaving a delivery unserved; large enough that the solver
+# only drops a stop when capacities or windows make it impossible to serve
+DROP_PENALTY = 10_000_000
+# Largest fleet one request may ask for; every vehicle adds a route to the model
+MAX_VEHICLES = 500
+MINUTES_PER_DAY = 24 * 60
+
+_CLOCK = re.compile(r'(\d{1,2}):(\d{2})\s*([AaPp][Mm])?')
+
+
+def parse_clock(value):
+    """'10:00 AM', '15:30' or minutes-after-midnight -> minutes after midnight; raises ValueError."""
+    if isinstance(value, (int, float)):
+        if not 0 <= value < MINUTES_PER_DAY:
+            raise ValueError(f"Time {value} is not a minute of the day (0-{MINUTES_PER_DAY - 1})")
+        return int(value)
+    match = _CLOCK.fullmatch(str(value).strip())
+    if not match:
+        raise ValueError(f"Unrecognised time '{value}'")
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    if minutes > 59 or hours > (12 if meridiem else 23):
+        raise ValueError(f"Time '{value}' is out of range")
+    if meridiem:
+        hours = hours % 12 + (12 if meridiem.upper() == 'PM' else 0)
+    return hours * 60 + minutes
+
+
+def parse_slot(slot):
+    """'10:00 AM - 12:00 PM' (the predicted slot format) or [start, end] -> (start, end) minutes."""
+    if isinstance(slot, (list, tuple)):
+        start, end = slot
+    else:
+        start, _, end = str(slot).partition('-')
+    window = parse_clock(start), parse_clock(end)
+    if window[0] >= window[1]:
+        raise ValueError(f"Time window '{slot}' must end after it starts")
+    return window
+
+
+def format_clock(minutes):
+    return f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+
+
+def delivery_time_window(delivery):
+    """Window for a delivery dict: explicit time_window, else its predicted slot, else None."""
+    for key in ('time_window', 'predicted_optimal_slot', 'slot', 'Machine Prediction'):
+        if delivery.get(key):
+            return parse_slot(delivery[key])
+    return None
+
+
+def delivery_quantity(delivery):
+    quantity = int(delivery.get('quantity', delivery.get('Order Item Quantity', 1)))
+    if quantity < 0:
+        raise ValueError(f"Delivery quantity must not be negative, got {quantity}")
+    return quantity
+
+
+def travel_time_matrix(distance_matrix, speed_kmph=DEFAULT_SPEED_KMPH, service_minutes=DEFAULT_SERVICE_MINUTES,
+                       drive_minutes=None):
+    """Whole minutes to leave node i (after serving it) and reach node j.
+
+    Driving times come from `drive_minutes` (e.g. road-network times) when
+    given, otherwise from the distances at a flat `speed_kmph`.
+    """
+    if drive_minutes is None:
+        drive_minutes = np.asarray(distance_matrix, dtype=np.float64) * (60.0 / speed_kmph)
+    minutes = np.ceil(drive_minutes).astype(np.int64)
+    # Service happens at the origin; the depot (row 0) has none
+    minutes[1:] += service_minutes
+    np.fill_diagonal(minutes, 0)
+    return minutes
+
+
+def solve_vrp(distance_matrix, demands, vehicle_capacities, time_windows,
+              shift=DEFAULT_SHIFT, speed_kmph=DEFAULT_SPEED_KMPH,
+              service_minutes=DEFAULT_SERVICE_MINUTES, time_limit_ms=None,
+              solution_limit=None, no_improvement_ms=DEFAULT_NO_IMPROVEMENT_MS,
+              metaheuristic=None, first_solution=None, drive_minutes=None):
+    """Solve a capacitated VRP with time windows; node 0 is the depot.
+
+    `demands` and `time_windows` are indexed by node (entries for the depot are
+    ignored; a window of None means any time during the shift). Deliveries that
+    cannot be served are dropped rather than failing the whole solve.
+    `drive_minutes`, if given, replaces the flat-speed driving times.
+
+    Returns a dict with one entry per vehicle in `routes`, the dropped nodes,
+    and the same objective / solve_time_ms / metaheuristic stats as solve_tsp;
+    None if OR-Tools found no solution at all.
+    """
+    num_locations = len(distance_matrix)
+    num_vehicles = len(vehicle_capacities)
+    started = time.perf_counter()
+
+    manager = pywrapcp.RoutingIndexManager(num_locations, num_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    cost_matrix = cost_matrix_meters(distance_matrix)
+    distance_index = routing.RegisterTransitMatrix(cost_matrix.tolist())
+    routing.SetArcCostEvaluatorOfAllVehicles(distance_index)
+
+    demand_index = routing.RegisterUnaryTransitVector([0] + [int(d) for d in demands[1:]])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_index, 0, [int(c) for c in vehicle_capacities], True, 'Capacity')
+
+    minutes = travel_time_matrix(distance_matrix, speed_kmph, service_minutes, drive_minutes)
+    time_index = routing.RegisterTransitMatrix(minutes.tolist())
+    routing.AddDimension(time_index, MAX_WAIT_MINUTES, shift[1], False, 'Time')
+    time_dimension = routing.GetDimensionOrDie('Time')
+
+    for node in range(1, num_locations):
+        index = manager.NodeToIndex(node)
+        start, end = time_windows[node] or shift
+        start, end = max(start, shift[0]), min(end, shift[1])
+        routing.AddDisjunction([index], DROP_PENALTY)
+        if start > end:
+            # The slot falls entirely outside the shift: nobody can serve it
+            routing.ActiveVar(index).SetValue(0)
+        else:
+            time_dimension.CumulVar(index).SetRange(start, end)
+    for vehicle in range(num_vehicles):
+        time_dimension.CumulVar(routing.Start(vehicle)).SetRange(*shift)
+        time_dimension.CumulVar(routing.End(vehicle)).SetRange(*shift)
+        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.Start(vehicle)))
+        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(vehicle)))
+
+    search_parameters, metaheuristic = search_parameters_for(
+        num_locations, time_limit_ms, solution_limit, metaheuristic, first_solution=first_solution)
+    progress = add_no_improvement_stop(routing, no_improvement_ms)
+
+    setup_ms = round((time.perf_counter() - started) * 1000, 2)
+    solution = routing.SolveWithParameters(search_parameters)
+    solve_time_ms = round((time.perf_counter() - started) * 1000, 2)
+    if not solution:
+        return None
+
+    routes = []
+    served = set()
+    for vehicle in range(num_vehicles):
+        route = extract_route(routing, manager, solution, vehicle)
+        distance = sum(int(cost_matrix[a][b]) for a, b in zip(route, route[1:])) / 1000.0
+        arrivals = []
+        index = routing.Start(vehicle)
+        while True:
+            arrivals.append(solution.Min(time_dimension.CumulVar(index)))
+            if routing.IsEnd(index):
+                break
+            index = solution.Value(routing.NextVar(index))
+        served.update(route[1:-1])
+        routes.append({
+            'vehicle': vehicle,
+            'route': route,
+            'distance': distance,
+            'load': int(sum(demands[node] for node in route[1:-1])),
+            'capacity': int(vehicle_capacities[vehicle]),
+            'arrival_minutes': arrivals,
+        })
+
+    dropped = [node for node in range(1, num_locations) if node not in served]
+    return {
+        'routes': routes,
+        'dropped': dropped,
+        'total_distance': sum(r['distance'] for r in routes),
+        'objective': solution.ObjectiveValue(),
+        'solve_time_ms': solve_time_ms,
+        'setup_ms': setup_ms,
+        'metaheuristic': metaheuristic,
+        'solutions': progress['solutions'],
+    }
+
+
+def vehicle_capacities_from(data, total_demand):
+    """Per-vehicle capacities from a request body's vehicle_count / vehicle_capacities."""
+    capacities = data.get('vehicle_capacities')
+    count = data.get('vehicle_count')
+    listed = isinstance(capacities, (list, tuple))
+    if count is not None:
+        count = int(count)
+        if count < 1:
+            raise ValueError('vehicle_count must be at least 1')
+    if listed and count is not None and count != len(capacities):
+        raise ValueError('vehicle_count does not match the number of vehicle_capacities')
+    if listed:
+        count = len(capacities)
+    elif count is None:
+        count = 1
+    if count > MAX_VEHICLES:
+        raise ValueError(f"At most {MAX_VEHICLES} vehicles are supported per request")
+    if listed:
+        capacities = [int(c) for c in capacities]
+    else:
+        # Without a capacity every vehicle could carry the whole manifest
+        capacities = [int(capacities) if capacities is not None else max(total_demand, 1)] * count
+    if not capacities or any(c <= 0 for c in capacities):
+        raise ValueError('At least one vehicle with a positive capacity is required')
+    return capacities
+
+
+def shift_from(data):
+    shift = data.get('shift')
+    if shift is None:
+        return DEFAULT_SHIFT
+    return parse_slot(shift)